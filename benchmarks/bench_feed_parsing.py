@@ -0,0 +1,47 @@
+"""
+Compare feedparser.parse() with the streaming ops.feed_stream.parse_recent() parser.
+
+Usage:
+    python benchmarks/bench_feed_parsing.py [feed.xml ...]
+
+Without arguments a large Substack-like feed (full post HTML in every item) is generated.
+"""
+import argparse
+import datetime
+import pathlib
+import sys
+import timeit
+
+import feedparser
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from fixtures import generate_substack_feed  # noqa: E402
+from ops.feed_stream import parse_recent  # noqa: E402
+
+
+def bench(name: str, content: bytes, number: int) -> None:
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=30)
+
+    feedparser_time = timeit.timeit(lambda: feedparser.parse(content), number=number) / number
+    stream_time = timeit.timeit(lambda: parse_recent(content, limit=10, cutoff=cutoff), number=number) / number
+
+    print(f"{name} ({len(content) / 1024:.0f} KiB)")
+    print(f"  feedparser.parse: {feedparser_time * 1000:8.1f} ms")
+    print(f"  parse_recent:     {stream_time * 1000:8.1f} ms  ({feedparser_time / stream_time:.0f}x faster)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("feeds", nargs="*", type=pathlib.Path, help="Saved RSS/Atom files")
+    parser.add_argument("--number", type=int, default=5, help="Runs per parser")
+    args = parser.parse_args()
+
+    if args.feeds:
+        for path in args.feeds:
+            bench(path.name, path.read_bytes(), args.number)
+    else:
+        bench("generated Substack feed", generate_substack_feed(), args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Rows per second of every bookshelf_parser backend on Goodreads shelf pages.
+
+Usage:
+    python benchmarks/bench_shelf_parsing.py [shelf.html ...]
+
+Without arguments a 100-row shelf page (per_page=100) is generated. Every backend
+must produce the same BookReview list, otherwise the benchmark fails.
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve() / "goodreads-books"))
+from bookshelf_parser import BACKENDS, parse_bookshelf_html  # noqa: E402
+from fixtures import generate_shelf_page  # noqa: E402
+
+
+def available_backends(content: str) -> list[str]:
+    backends = []
+    for backend in BACKENDS:
+        try:
+            parse_bookshelf_html(content, backend=backend)
+        except Exception as e:  # e.g. bs4.FeatureNotFound when lxml is not installed
+            print(f"  skipping {backend}: {e}")
+            continue
+        backends.append(backend)
+    return backends
+
+
+def bench(name: str, content: str, number: int) -> None:
+    print(f"{name} ({len(content) / 1024:.0f} KiB)")
+    backends = available_backends(content)
+
+    reference = parse_bookshelf_html(content, skip_unread=False, backend=backends[0])
+    rows = len(reference.books)
+    for backend in backends[1:]:
+        if parse_bookshelf_html(content, skip_unread=False, backend=backend) != reference:
+            raise SystemExit(f"Backend {backend} produced different books than {backends[0]}")
+
+    for backend in backends:
+        seconds = timeit.timeit(lambda: parse_bookshelf_html(content, skip_unread=False, backend=backend), number=number)
+        per_page = seconds / number
+        print(f"  {backend:12} {per_page * 1000:8.1f} ms/page  {rows / per_page:10.0f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pages", nargs="*", type=pathlib.Path, help="Saved shelf HTML pages")
+    parser.add_argument("--number", type=int, default=10, help="Runs per backend")
+    args = parser.parse_args()
+
+    if args.pages:
+        for path in args.pages:
+            bench(path.name, path.read_text(encoding="utf-8"), args.number)
+    else:
+        bench("generated shelf page", generate_shelf_page(), args.number)
+
+
+if __name__ == "__main__":
+    main()
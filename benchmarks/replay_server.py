@@ -0,0 +1,100 @@
+"""
+Local HTTP stand-in that replays fixtures (see fixtures.py) with simulated latency.
+
+`https://host/path?query` is served as `http://127.0.0.1:<port>/host/path?query`,
+see ReplayServer.local_url().
+
+Usage:
+    python benchmarks/replay_server.py FIXTURES_DIR [--port 8765] [--latency 50] [--jitter 20]
+"""
+import argparse
+import pathlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from fixtures import fixture_path
+
+
+def _content_type(content: bytes) -> str:
+    head = content[:256].lstrip().lower()
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if head.startswith(b"\x89png"):
+        return "image/png"
+    if head.startswith(b"<!doctype html") or head.startswith(b"<html"):
+        return "text/html; charset=utf-8"
+    if b"<feed" in head:
+        return "application/atom+xml; charset=utf-8"
+    if head.startswith(b"<"):
+        return "application/rss+xml; charset=utf-8"
+    return "application/octet-stream"
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures_dir: pathlib.Path, port: int = 0, latency: float = 0.05, jitter: float = 0.0):
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._lock = threading.Lock()
+        super().__init__(("127.0.0.1", port), _ReplayHandler)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def local_url(self, url: str) -> str:
+        parts = urlsplit(url)
+        local = f"{self.base_url}/{parts.hostname}{parts.path or '/'}"
+        return f"{local}?{parts.query}" if parts.query else local
+
+    def start(self) -> "ReplayServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+
+    def do_GET(self):
+        with self.server._lock:
+            self.server.requests += 1
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+
+        host, _, rest = self.path.lstrip("/").partition("/")
+        path = fixture_path(self.server.fixtures_dir, f"https://{host}/{rest}")
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        content = path.read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", _content_type(content))
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", type=pathlib.Path, help="Fixtures directory")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=50, help="Delay before every response, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Extra random delay up to this many ms")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixtures, port=args.port, latency=args.latency / 1000, jitter=args.jitter / 1000)
+    print(f"Replaying {args.fixtures} on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+End-to-end benchmarks of the ops scripts, fully offline.
+
+Every HTTP request goes to a local replay server (replay_server.py) that serves the
+fixtures with the given latency, so the numbers include the scripts' network
+behaviour (pagination, concurrency, caching) without depending on the real sites.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--latency 50] [--repeat 3] [--compare results/old.json]
+    python benchmarks/run_benchmarks.py --record   # record fixtures from the live sites first
+
+Fixtures are read from benchmarks/fixtures/ when it has been recorded, otherwise they
+are generated into a temporary directory. Results are written as JSON to
+benchmarks/results/<git commit>.json (or --output).
+"""
+import argparse
+import contextlib
+import dataclasses
+import datetime
+import importlib.util
+import io
+import shutil
+import json
+import logging
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable
+
+ROOT = pathlib.Path(__file__).parent.parent.resolve()
+for path in (ROOT, ROOT / "goodreads-books", ROOT / "uasubstack", ROOT / "blogroll"):
+    sys.path.append(str(path))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import build_feed  # noqa: E402
+import image_utils  # noqa: E402
+import refresh_registry  # noqa: E402
+import run_rss  # noqa: E402
+from bookshelf_parser import process_bookshelf_page  # noqa: E402
+from fixtures import (  # noqa: E402
+    COVERS,
+    GOODREADS_ALL_SHELF,
+    GOODREADS_RSS_URL,
+    GOODREADS_SHELF_URL,
+    PUBLICATIONS,
+    SUBSTACK_FEEDS,
+    SUBSTACK_PUBLICATION_URL,
+    fixture_path,
+    goodreads_rss_url,
+    load_index,
+    record_fixture,
+    save_index,
+    write_generated_fixtures,
+)
+from ops.feed_cache import forget_fetched_feeds  # noqa: E402
+from ops.http import HttpClient, get_client, set_client  # noqa: E402
+from replay_server import ReplayServer  # noqa: E402
+
+
+def _load_module(name: str, path: pathlib.Path):
+    # blogroll/run.py and goodreads-books/run.py can't both be imported as `run`
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+blogroll_run = _load_module("blogroll_run", ROOT / "blogroll" / "run.py")
+
+RECORDED_FIXTURES_DIR = pathlib.Path(__file__).parent.resolve() / "fixtures"
+RESULTS_DIR = pathlib.Path(__file__).parent.resolve() / "results"
+
+
+@dataclasses.dataclass
+class Benchmark:
+    name: str
+    run: Callable[[], object]
+    # Called before every run, outside of the timed part
+    setup: Callable[[], None] | None = None
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def record(fixtures_dir: pathlib.Path) -> None:
+    """Record the live responses the benchmarks replay."""
+    client = get_client()
+
+    def fetch(url: str) -> bytes:
+        response = client.get(url)
+        response.raise_for_status()
+        return response.content
+
+    def save(url: str, fixture_url: str | None = None) -> bytes | None:
+        try:
+            content = fetch(url)
+        except Exception as e:
+            print(f"  failed to record {url}: {e}")
+            return None
+        record_fixture(fixtures_dir, fixture_url or url, content)
+        print(f"  recorded {fixture_url or url}")
+        return content
+
+    covers = []
+    for shelf in ("read", GOODREADS_ALL_SHELF):
+        page = 1
+        while page <= run_rss.MAX_PAGES:
+            content = save(run_rss.build_rss_url(shelf, page), goodreads_rss_url(shelf, page))
+            if content is None:
+                break
+            items = ET.fromstring(content).findall(".//item")
+            for item in items:
+                book = run_rss.parse_book_from_item(item)
+                if book and book.cover_url and "nophoto" not in book.cover_url and len(covers) < COVERS:
+                    covers.append(book.cover_url)
+            if not items:
+                break
+            page += 1
+        # fetch_shelf() requests a few pages past the end
+        for extra_page in range(page + 1, page + run_rss.PAGE_WINDOW + 1):
+            save(run_rss.build_rss_url(shelf, extra_page), goodreads_rss_url(shelf, extra_page))
+
+    save(GOODREADS_SHELF_URL)
+    covers = [url for url in covers if save(url) is not None]
+
+    substack_feeds = []
+    for blog in build_feed.build_substack_blogs()[:SUBSTACK_FEEDS]:
+        if save(blog["feed_url"]) is not None:
+            substack_feeds.append(blog["feed_url"])
+
+    for feed_url in blogroll_run.FEEDS:
+        save(feed_url)
+
+    publications = []
+    for dump_path in sorted(refresh_registry.substacks_path.glob("*.json"))[:PUBLICATIONS]:
+        subdomain = json.loads(dump_path.read_text(encoding="utf-8"))["subdomain"]
+        if save(SUBSTACK_PUBLICATION_URL.format(subdomain=subdomain)) is not None:
+            publications.append(subdomain)
+
+    save_index(fixtures_dir, substack_feeds, covers, publications)
+
+
+def build_benchmarks(fixtures_dir: pathlib.Path, server: ReplayServer, work_dir: pathlib.Path) -> list[Benchmark]:
+    index = load_index(fixtures_dir)
+
+    # parse_book_from_item / process_bookshelf_page: parsing only
+    rss_items = ET.fromstring(fixture_path(fixtures_dir, goodreads_rss_url("read", 1)).read_bytes()).findall(".//item")
+    shelf_html = fixture_path(fixtures_dir, GOODREADS_SHELF_URL).read_text(encoding="utf-8")
+
+    # run_rss.fetch_shelf: paginated RSS fetch
+    run_rss.RSS_BASE_URL = server.local_url(GOODREADS_RSS_URL)
+
+    # build_feed.process_feeds: registry feeds, cold cache and fresh export every run
+    substack_blogs = [
+        {
+            "feed_url": server.local_url(feed_url),
+            "logo": None,
+            "name": feed_url,
+            "hero_text": None,
+            "base_url": feed_url.removesuffix("feed/"),
+        }
+        for feed_url in index["substack_feeds"]
+    ]
+    build_feed.build_substack_blogs = lambda: substack_blogs
+
+    def setup_process_feeds():
+        forget_fetched_feeds()
+        run_dir = pathlib.Path(tempfile.mkdtemp(dir=work_dir))
+        build_feed.feed_cache_path = run_dir / "feed_cache.json"
+        build_feed.export_dir = run_dir / "export"
+        build_feed.aggregated_posts_path = build_feed.export_dir / "posts.json"
+        build_feed.aggregated_blogs_path = build_feed.export_dir / "blogs.json"
+        build_feed.archive_dir = build_feed.export_dir / "posts"
+
+    # blogroll main: cold cache every run
+    blogroll_run.FEEDS = [server.local_url(feed_url) for feed_url in blogroll_run.FEEDS]
+
+    def setup_blogroll():
+        forget_fetched_feeds()
+        run_dir = pathlib.Path(tempfile.mkdtemp(dir=work_dir))
+        blogroll_run.feed_cache_path = run_dir / "feed_cache.json"
+        blogroll_run.blogroll_json_path = run_dir / "blogroll.json"
+
+    # refresh_registry.refresh: a fresh copy of the recorded publications every run, all of them checked
+    publications = index.get("publications", [])
+    publication_url_template = f"{server.base_url}/{SUBSTACK_PUBLICATION_URL.removeprefix('https://')}"
+    registry_dumps = [
+        dump_path
+        for dump_path in sorted(refresh_registry.substacks_path.glob("*.json"))
+        if json.loads(dump_path.read_text(encoding="utf-8"))["subdomain"] in publications
+    ]
+
+    def setup_refresh_registry():
+        run_dir = pathlib.Path(tempfile.mkdtemp(dir=work_dir))
+        refresh_registry.substacks_path = run_dir / "substacks"
+        refresh_registry.substacks_path.mkdir()
+        for dump_path in registry_dumps:
+            shutil.copy(dump_path, refresh_registry.substacks_path)
+
+    # download_cover_image: one by one, into an empty images dir every run
+    covers = [server.local_url(cover_url) for cover_url in index["covers"]]
+
+    def setup_covers():
+        image_utils.IMAGES_DIR = pathlib.Path(tempfile.mkdtemp(dir=work_dir))
+
+    def download_covers():
+        for cover_url in covers:
+            image_utils.download_cover_image(cover_url)
+
+    return [
+        Benchmark(
+            f"run_rss.parse_book_from_item[{len(rss_items)} items]",
+            lambda: [run_rss.parse_book_from_item(item) for item in rss_items],
+        ),
+        Benchmark(
+            "bookshelf_parser.process_bookshelf_page",
+            lambda: process_bookshelf_page(BeautifulSoup(shelf_html, "html.parser"), skip_unread=False),
+        ),
+        Benchmark("run_rss.fetch_shelf[read]", lambda: run_rss.fetch_shelf("read", skip_unread=True)),
+        Benchmark(f"run_rss.fetch_all_shelves[{GOODREADS_ALL_SHELF}]", run_rss.fetch_all_shelves),
+        Benchmark(
+            f"build_feed.process_feeds[{len(substack_blogs)} feeds]",
+            build_feed.process_feeds,
+            setup_process_feeds,
+        ),
+        Benchmark(f"blogroll.run.main[{len(blogroll_run.FEEDS)} feeds]", blogroll_run.main, setup_blogroll),
+        Benchmark(
+            f"refresh_registry.refresh[{len(publications)} publications]",
+            lambda: refresh_registry.refresh(
+                url_template=publication_url_template, max_age_days=1, budget=len(registry_dumps)
+            ),
+            setup_refresh_registry,
+        ),
+        Benchmark(f"image_utils.download_cover_image[{len(covers)} covers]", download_covers, setup_covers),
+    ]
+
+
+def run_benchmark(benchmark: Benchmark, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        if benchmark.setup:
+            benchmark.setup()
+        # The scripts print progress for every feed / page
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            benchmark.run()
+            runs.append(time.perf_counter() - start)
+    return {
+        "runs": runs,
+        "min": min(runs),
+        "median": statistics.median(runs),
+        "mean": statistics.mean(runs),
+    }
+
+
+def compare(results: dict, previous_path: pathlib.Path) -> None:
+    previous = json.loads(previous_path.read_text(encoding="utf-8"))["benchmarks"]
+    print(f"\nCompared with {previous_path.name} (median):")
+    for name, result in results.items():
+        if name not in previous:
+            print(f"  {name:55} new")
+            continue
+        change = result["median"] / previous[name]["median"] - 1
+        print(f"  {name:55} {change:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=50, help="Replay server delay per response, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Extra random delay up to this many ms")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark")
+    parser.add_argument("--fixtures", type=pathlib.Path, help="Fixtures directory (default: recorded or generated)")
+    parser.add_argument("--record", action="store_true", help=f"Record fixtures from the live sites into {RECORDED_FIXTURES_DIR.name}/")
+    parser.add_argument("--output", type=pathlib.Path, help="Results file (default: results/<git commit>.json)")
+    parser.add_argument("--compare", type=pathlib.Path, help="Previous results file to compare with")
+    args = parser.parse_args()
+
+    # run_rss configures logging on import
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.record:
+        print(f"Recording fixtures into {RECORDED_FIXTURES_DIR}")
+        record(RECORDED_FIXTURES_DIR)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = pathlib.Path(work_dir)
+
+        fixtures_dir = args.fixtures
+        if fixtures_dir is None and (RECORDED_FIXTURES_DIR / "fixtures.json").exists():
+            fixtures_dir = RECORDED_FIXTURES_DIR
+        if fixtures_dir is None:
+            fixtures_dir = work_dir / "fixtures"
+            write_generated_fixtures(fixtures_dir, blogroll_run.FEEDS, refresh_registry.substacks_path)
+        print(f"Fixtures: {fixtures_dir}, latency {args.latency:.0f}±{args.jitter:.0f} ms")
+
+        server = ReplayServer(fixtures_dir, latency=args.latency / 1000, jitter=args.jitter / 1000).start()
+        # No per-host rate limiting against the local server, only the simulated latency
+        set_client(HttpClient(host_rates={"127.0.0.1": (1e6, 1000)}))
+
+        results = {}
+        for benchmark in build_benchmarks(fixtures_dir, server, work_dir):
+            result = run_benchmark(benchmark, args.repeat)
+            results[benchmark.name] = result
+            print(f"  {benchmark.name:55} {result['median'] * 1000:9.1f} ms (min {result['min'] * 1000:.1f} ms)")
+        print(f"{server.requests} requests replayed")
+        server.shutdown()
+
+    commit = _git_commit()
+    output = args.output or RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "commit": commit,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixtures": "recorded" if fixtures_dir == RECORDED_FIXTURES_DIR else str(args.fixtures or "generated"),
+        "latency_ms": args.latency,
+        "jitter_ms": args.jitter,
+        "repeat": args.repeat,
+        "benchmarks": results,
+    }, indent=2), encoding="utf-8")
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,105 @@
+import argparse
 import datetime
-import json
 import pathlib
-import time
+import sys
 
-import feedparser
-from enhased_json_encoder import EnhancedJSONEncoder
+# Make the shared `ops` package importable when running as `python run.py`
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from ops.entries import FeedEntry, entries_from_feed, sort_key  # noqa: E402
+from ops.feed_cache import FeedCache  # noqa: E402
+from ops.feed_schedule import PollSchedule  # noqa: E402
+from ops.json_encoder import EnhancedJSONEncoder  # noqa: E402
+from ops.metrics import get_metrics, run_job  # noqa: E402
+from ops.output import write_json_if_changed  # noqa: E402
 
 blogroll_json_path = pathlib.Path(__file__).parent.resolve() / "data" / "blogroll.json"
-
-
-def clean_entry(entry):
+feed_cache_path = pathlib.Path(__file__).parent.resolve() / "data" / "feed_cache.json"
+
+FEEDS = [
+    "https://sinja.io/rss",
+    "https://mrgall.com/feed/",
+    "https://www.govorukhin.com/blog/rss.xml",
+    "https://poohitan.com/rss",
+    "https://zemlan.in/rss.xml",
+    "https://swizec.com/rss.xml",
+    "https://ciechanow.ski/atom.xml",
+    "https://toytakeorg.substack.com/feed/",
+    "https://vtlk.substack.com/feed/",
+    "https://dariiavozna.substack.com/feed/",
+    "https://7uapoems.substack.com/feed/",
+    "https://blnk.substack.com/feed/",
+    "https://zametkin.me/feed/",
+    "https://blog.alexkolodko.com/rss/",
+    "https://world.hey.com/jason/feed.atom",
+    "https://moretothat.com/feed/",
+    "https://www.autodidacts.io/rss/",
+    "https://snyder.substack.com/feed",
+    "https://waitbutwhy.com/feed",
+    "https://reporters.media/feed/",
+    "https://zaytsev.io/blog/rss/",
+    "https://www.the-next.me/rss/",
+    "https://zverok.space/feed.xml",
+    "https://paulstamatiou.com/posts.xml",
+    "https://www.julian.digital/feed",
+    "https://chrisnicholas.dev/rss.xml",
+    "https://oykun.com/rss/",
+    "https://vanschneider.com/blog/rss/",
+    "https://media3.substack.com/feed/",
+    "https://tlfrd.substack.com/feed/",
+    "https://www.rozhkov.me/rss/",
+    "https://feeds.feedburner.com/ostrozub/new?format=xml",
+    "https://gallery21.blog/feed/",
+    "https://foodiereads.org/feed/",
+]
+
+
+def clean_entry(entry: FeedEntry):
     return {
         "title": entry.title,
-        "link": entry.link,
+        "link": entry.url,
         "published": entry.published,
     }
 
 
-def main():
+def main(fetch_all: bool = False):
     thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
-
-    feeds = [
-        "https://sinja.io/rss",
-        "https://mrgall.com/feed/",
-        "https://www.govorukhin.com/blog/rss.xml",
-        "https://poohitan.com/rss",
-        "https://zemlan.in/rss.xml",
-        "https://swizec.com/rss.xml",
-        "https://ciechanow.ski/atom.xml",
-        "https://toytakeorg.substack.com/feed/",
-        "https://vtlk.substack.com/feed/",
-        "https://dariiavozna.substack.com/feed/",
-        "https://7uapoems.substack.com/feed/",
-        "https://blnk.substack.com/feed/",
-        "https://zametkin.me/feed/",
-        "https://blog.alexkolodko.com/rss/",
-        "https://world.hey.com/jason/feed.atom",
-        "https://moretothat.com/feed/",
-        "https://www.autodidacts.io/rss/",
-        "https://snyder.substack.com/feed",
-        "https://waitbutwhy.com/feed",
-        "https://reporters.media/feed/",
-        "https://zaytsev.io/blog/rss/",
-        "https://www.the-next.me/rss/",
-        "https://zverok.space/feed.xml",
-        "https://paulstamatiou.com/posts.xml",
-        "https://www.julian.digital/feed",
-        "https://chrisnicholas.dev/rss.xml",
-        "https://oykun.com/rss/",
-        "https://vanschneider.com/blog/rss/",
-        "https://media3.substack.com/feed/",
-        "https://tlfrd.substack.com/feed/",
-        "https://www.rozhkov.me/rss/",
-        "https://feeds.feedburner.com/ostrozub/new?format=xml",
-        "https://gallery21.blog/feed/",
-        "https://foodiereads.org/feed/",
-    ]
-
-    entries = []
-
-    def is_valid_entry(entry):
-        if not hasattr(entry, "title"):
-            return False
-
-        return struct_time_to_datetime(entry.published_parsed) > thirty_days_ago
-
-    for feed_url in feeds:
-        print("Processing feed:", feed_url)
-        feed = feedparser.parse(feed_url)
-        feed_entries = list(filter(is_valid_entry, feed.entries))[:10]
-        if not feed_entries:
-            # If there are no entries in the last 30 days, take the last 3 entries
-            feed_entries = feed.entries[:3]
-        entries.extend(feed_entries)
+    cutoff_ts = int(thirty_days_ago.timestamp())
+
+    metrics = get_metrics()
+    entries: list[FeedEntry] = []
+    # Feeds that are not due yet (see PollSchedule) are served from the cache
+    feed_cache = FeedCache(feed_cache_path, schedule=None if fetch_all else PollSchedule())
+
+    with metrics.phase("fetch"):
+        for feed_url in FEEDS:
+            print("Processing feed:", feed_url)
+            # Only the compact entries are kept, not the parsed feed
+            all_entries = entries_from_feed(feed_cache.parse(feed_url, limit=10, cutoff=thirty_days_ago))
+            feed_entries = [entry for entry in all_entries if entry.published_ts > cutoff_ts][:10]
+            if not feed_entries:
+                # If there are no entries in the last 30 days, take the last 3 entries
+                feed_entries = all_entries[:3]
+            entries.extend(feed_entries)
+            metrics.item("feeds", feed_url).update(kept=len(feed_entries), dropped=len(all_entries) - len(feed_entries))
+
+    feed_cache.save()
+    print(feed_cache.summary())
 
     # Order by date
-    entries = sorted(
-        entries,
-        key=lambda entry: struct_time_to_datetime(entry.published_parsed),
-        reverse=True,
-    )
+    entries.sort(key=sort_key, reverse=True)
     clean_entries = [clean_entry(entry) for entry in entries]
     print("Total entries:", len(clean_entries))
 
-    with open(blogroll_json_path, "w", encoding="utf-8") as f:
+    with metrics.phase("write"):
         books_dict = {"feed": clean_entries}
-        json_str = json.dumps(
-            books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2
+        write_json_if_changed(
+            blogroll_json_path, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2
         )
-        f.write(json_str)
-
-
-def struct_time_to_datetime(st: time.struct_time) -> datetime.datetime:
-    """Convert a struct_time to datetime maintaining timezone information when present"""
-    tz = None
-    if hasattr(st, "tm_gmtoff") and st.tm_gmtoff is not None:
-        tz = datetime.timezone(datetime.timedelta(seconds=st.tm_gmtoff))
-    # datetime doesn't like leap seconds so just truncate to 59 seconds
-    if st.tm_sec in {60, 61}:
-        return datetime.datetime(*st[:5], 59, tzinfo=tz)
-    return datetime.datetime(*st[:6], tzinfo=tz)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Collect recent posts of the blogroll feeds")
+    parser.add_argument("--all-feeds", action="store_true", help="Fetch every feed, not only the ones that are due")
+    parser.add_argument("--profile", action="store_true", help="Profile the run with cProfile")
+    args = parser.parse_args()
+    run_job("blogroll", lambda: main(fetch_all=args.all_feeds), pathlib.Path(__file__).parent.resolve(), profile=args.profile)
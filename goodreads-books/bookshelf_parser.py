@@ -0,0 +1,368 @@
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+goodreads_base_url = "https://www.goodreads.com"
+
+# "stream" is a single-pass extractor that only materialises rows of table#books,
+# the others build a full BeautifulSoup tree with the given bs4 tree builder.
+BACKENDS = ("html.parser", "lxml", "stream")
+DEFAULT_BACKEND = "html.parser"
+
+_COVER_SIZE_PATTERN = re.compile(r"\._S[YX]\d+(_S[YX]\d+)?_\.")
+_TOTAL_BOOKS_PATTERN = re.compile(r"\d+")
+
+
+@dataclass
+class BookReview:
+    title: str
+    author: str
+    cover_url: str
+    review_url: str
+    rating: int | None = None
+    date_started: datetime.date = None
+    date_read: datetime.date = None
+    is_reading_now: bool = False
+    own: bool = False
+    # Responsive variants and intrinsic size of the local cover, see image_utils.cover_image_srcset()
+    cover_srcset: str | None = None
+    cover_width: int | None = None
+    cover_height: int | None = None
+
+
+@dataclass
+class ShelfPage:
+    books: list[BookReview]
+    # Total number of books on the shelf, from the page header
+    total_books: int | None = None
+
+
+def process_bookshelf_page(page_content: BeautifulSoup, skip_unread: bool = True) -> list[BookReview]:
+    books_table = page_content.find('table', id='books')
+    books = []
+
+    if not books_table:
+        logger.warning("No books table found on page")
+        # Print table content
+        print(page_content)
+        return books
+
+    shelf_header = page_content.find('span', class_='h1Shelf')
+    is_current_reading_shelf = shelf_header and "Currently Reading" in shelf_header.text
+
+    for row in books_table.find_all('tr')[1:]:  # skip header
+        title_field = row.find('td', class_='field title')
+        if not title_field:
+            continue
+
+        title_link = title_field.find('a')
+        if not title_link:
+            continue
+
+        title = title_link.text.strip().replace("\n", " ")
+
+        author_field = row.find('td', class_='field author')
+        author = ""
+        if author_field:
+            author_link = author_field.find('a')
+            if author_link:
+                author = author_link.text
+                if author:
+                    # swap first and last name
+                    author = " ".join(reversed(author.split(","))).strip()
+
+        cover_url = ""
+        img = row.find('img')
+        if img and img.get("src"):
+            cover_url = img["src"]
+            # Replace small cover with big one
+            cover_url = _COVER_SIZE_PATTERN.sub(".", cover_url)
+
+        rating_field = row.find('td', class_='field rating')
+        rating = None
+        if rating_field:
+            # Find div with class class="stars", use data-rating property of this field
+            rating = len(rating_field.find_all('a', class_='star on')) or None
+
+        date_started = None
+        date_started_field = row.find('td', class_='field date_started')
+        if date_started_field:
+            date_started_value = date_started_field.find('span', class_='date_started_value')
+            if date_started_value:
+                date_started = date_str_to_date(date_started_value.text)
+
+        date_read = None
+        date_read_field = row.find('td', class_='field date_read')
+        if date_read_field:
+            date_read_value = date_read_field.find('span', class_='date_read_value')
+            if date_read_value:
+                date_read = date_str_to_date(date_read_value.text)
+
+        if skip_unread and not date_started and not date_read:
+            continue
+
+        review_url = ""
+        actions_field = row.find('td', class_='field actions')
+        if actions_field:
+            actions_link = actions_field.find('a', class_='actionLinkLite viewLink nobreak')
+            if actions_link and actions_link.get("href"):
+                review_url = f"{goodreads_base_url}{actions_link['href']}"
+
+        book = BookReview(
+            title=title,
+            author=author,
+            cover_url=cover_url,
+            rating=rating,
+            date_started=date_started,
+            date_read=date_read,
+            review_url=review_url,
+            is_reading_now=is_current_reading_shelf
+        )
+
+        books.append(book)
+
+    return books
+
+
+def date_str_to_date(date: str) -> datetime.date:
+    """
+    Convert date string to datetime
+
+    :param date: Date in string format like Feb 08, 2023 or Feb 2023
+    :return: Date instance
+    """
+    if ", " not in date:
+        date_obj = datetime.strptime(date, "%b %Y").replace(day=1)
+    else:
+        date_obj = datetime.strptime(date, "%b %d, %Y")
+
+    return date_obj.date()
+
+
+
+def _total_books(grey_text: str | None) -> int | None:
+    if grey_text is None:
+        return None
+    total_books_match = _TOTAL_BOOKS_PATTERN.search(grey_text)
+    return int(total_books_match.group()) if total_books_match else None
+
+
+def _parse_with_soup(content: str, skip_unread: bool, features: str) -> ShelfPage:
+    books_page_content = BeautifulSoup(content, features)
+    books = process_bookshelf_page(books_page_content, skip_unread)
+
+    grey_text = None
+    shelf_header = books_page_content.find('span', class_='h1Shelf')
+    if shelf_header:
+        grey_text_span = shelf_header.find('span', class_='greyText')
+        if grey_text_span:
+            grey_text = grey_text_span.text
+
+    return ShelfPage(books=books, total_books=_total_books(grey_text))
+
+
+class _TextCapture:
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.depth = 1
+        self.parts = []
+
+
+class _ShelfRowsParser(HTMLParser):
+    """
+    Single-pass extractor of the table#books rows of a shelf page.
+
+    Collects exactly the values process_bookshelf_page() looks up with bs4,
+    without building a tree for the rest of the document.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.has_books_table = False
+        self.shelf_header = None
+        self.grey_text = None
+        self.rows = []
+
+        self._table_depth = 0
+        self._row_index = -1
+        self._row = None
+        self._td_class = None
+        self._captures: dict[str, _TextCapture] = {}
+
+    def _start_capture(self, key: str, tag: str) -> None:
+        self._captures[key] = _TextCapture(tag)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+
+        for capture in self._captures.values():
+            if capture.tag == tag:
+                capture.depth += 1
+
+        if tag == "span" and "h1Shelf" in classes and self.shelf_header is None and "shelf_header" not in self._captures:
+            self._start_capture("shelf_header", tag)
+        elif tag == "span" and "greyText" in classes and "shelf_header" in self._captures and self.grey_text is None:
+            self._start_capture("grey_text", tag)
+
+        if tag == "table":
+            if self._table_depth:
+                self._table_depth += 1
+            elif attrs.get("id") == "books" and not self.has_books_table:
+                self.has_books_table = True
+                self._table_depth = 1
+            return
+
+        if not self._table_depth:
+            return
+
+        if tag == "tr":
+            self._row_index += 1
+            self._row = None
+            if self._row_index > 0:  # skip header
+                self._row = {"tds": set(), "stars": 0}
+                self.rows.append(self._row)
+            return
+
+        row = self._row
+        if row is None:
+            return
+
+        if tag == "td":
+            self._td_class = attrs.get("class")
+            row["tds"].add(self._td_class)
+        elif tag == "img":
+            row.setdefault("img_src", attrs.get("src"))
+        elif tag == "a":
+            if self._td_class == "field title" and "title" not in row:
+                row["title"] = None
+                self._start_capture("title", tag)
+            elif self._td_class == "field author" and "author" not in row:
+                row["author"] = None
+                self._start_capture("author", tag)
+            elif self._td_class == "field rating" and attrs.get("class") == "star on":
+                row["stars"] += 1
+            elif (
+                self._td_class == "field actions"
+                and "review_href" not in row
+                and attrs.get("class") == "actionLinkLite viewLink nobreak"
+            ):
+                row["review_href"] = attrs.get("href")
+        elif tag == "span":
+            if self._td_class == "field date_started" and "date_started_value" in classes and "date_started" not in row:
+                row["date_started"] = None
+                self._start_capture("date_started", tag)
+            elif self._td_class == "field date_read" and "date_read_value" in classes and "date_read" not in row:
+                row["date_read"] = None
+                self._start_capture("date_read", tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        # <img> is void and never gets an end tag in the non self-closing form either
+        if tag != "img":
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        for key, capture in list(self._captures.items()):
+            if capture.tag != tag:
+                continue
+            capture.depth -= 1
+            if capture.depth == 0:
+                del self._captures[key]
+                text = "".join(capture.parts)
+                if key == "shelf_header":
+                    self.shelf_header = text
+                elif key == "grey_text":
+                    self.grey_text = text
+                elif self._row is not None:
+                    self._row[key] = text
+
+        if not self._table_depth:
+            return
+        if tag == "table":
+            self._table_depth -= 1
+        elif tag == "td":
+            self._td_class = None
+
+    def handle_data(self, data):
+        for capture in self._captures.values():
+            capture.parts.append(data)
+
+
+def _parse_with_stream(content: str, skip_unread: bool) -> ShelfPage:
+    parser = _ShelfRowsParser()
+    parser.feed(content)
+    parser.close()
+
+    if not parser.has_books_table:
+        logger.warning("No books table found on page")
+        return ShelfPage(books=[], total_books=_total_books(parser.grey_text))
+
+    # Same values as process_bookshelf_page(): None when there is no shelf header
+    is_current_reading_shelf = None if parser.shelf_header is None else "Currently Reading" in parser.shelf_header
+
+    books = []
+    for row in parser.rows:
+        if "field title" not in row["tds"] or row.get("title") is None:
+            continue
+
+        title = row["title"].strip().replace("\n", " ")
+
+        author = ""
+        if row.get("author"):
+            # swap first and last name
+            author = " ".join(reversed(row["author"].split(","))).strip()
+
+        cover_url = ""
+        if row.get("img_src"):
+            # Replace small cover with big one
+            cover_url = _COVER_SIZE_PATTERN.sub(".", row["img_src"])
+
+        rating = None
+        if "field rating" in row["tds"]:
+            rating = row["stars"] or None
+
+        date_started = date_str_to_date(row["date_started"]) if row.get("date_started") is not None else None
+        date_read = date_str_to_date(row["date_read"]) if row.get("date_read") is not None else None
+
+        if skip_unread and not date_started and not date_read:
+            continue
+
+        review_url = ""
+        if row.get("review_href"):
+            review_url = f"{goodreads_base_url}{row['review_href']}"
+
+        books.append(BookReview(
+            title=title,
+            author=author,
+            cover_url=cover_url,
+            rating=rating,
+            date_started=date_started,
+            date_read=date_read,
+            review_url=review_url,
+            is_reading_now=is_current_reading_shelf
+        ))
+
+    return ShelfPage(books=books, total_books=_total_books(parser.grey_text))
+
+
+def parse_bookshelf_html(content: str, skip_unread: bool = True, backend: str = DEFAULT_BACKEND) -> ShelfPage:
+    """
+    Parse the HTML of a Goodreads shelf page with the given backend.
+
+    :param content: Page HTML
+    :param skip_unread: Include unread books or not
+    :param backend: One of BACKENDS. "lxml" needs the optional lxml package
+    :return: Books of the page and the total number of books on the shelf
+    """
+    if backend == "stream":
+        return _parse_with_stream(content, skip_unread)
+    if backend in BACKENDS:
+        return _parse_with_soup(content, skip_unread, backend)
+    raise ValueError(f"Unknown shelf parser backend {backend!r}, expected one of {BACKENDS}")
@@ -1,12 +0,0 @@
-import dataclasses
-import datetime
-import json
-
-
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        if isinstance(o, datetime.date):
-            return o.isoformat()
-        return super().default(o)
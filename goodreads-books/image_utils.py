@@ -1,22 +1,37 @@
+import functools
+import hashlib
 import io
+import json
 import logging
 import pathlib
 import re
-from urllib.request import Request, urlopen
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 from PIL import Image
 
+from ops.http import get_client
+from ops.metrics import get_metrics
+from ops.output import write_json_if_changed
+
 logger = logging.getLogger(__name__)
 
 IMAGES_DIR = pathlib.Path(__file__).parent.resolve() / "data" / "images"
+MANIFEST_PATH = IMAGES_DIR / "manifest.json"
 GITHUB_IMAGES_BASE_URL = (
     "https://raw.githubusercontent.com/Vadimkin/vadymklymenko-ops/main/goodreads-books/data/images"
 )
 
 _BOOK_ID_PATTERN = re.compile(r"/(\d+)\.\w+$")
 
+DOWNLOAD_WORKERS = 8
+
+# Responsive variants ({book_id}-{width}w.webp) generated next to every full-size cover
+VARIANT_WIDTHS = (120, 240, 480)
+WEBP_QUALITY = 80
+WEBP_METHOD = 6  # slowest / best compression, done once per cover
 
-def _extract_book_id(cover_url: str) -> str | None:
+
+def extract_book_id(cover_url: str) -> str | None:
     match = _BOOK_ID_PATTERN.search(cover_url)
     return match.group(1) if match else None
 
@@ -25,34 +40,200 @@ def _cover_image_path(book_id: str) -> pathlib.Path:
     return IMAGES_DIR / f"{book_id}.webp"
 
 
+def _variant_image_path(book_id: str, width: int) -> pathlib.Path:
+    return IMAGES_DIR / f"{book_id}-{width}w.webp"
+
+
+def _fetch_cover_image(cover_url: str) -> bytes:
+    response = get_client().get(cover_url)
+    response.raise_for_status()
+    return response.content
+
+
+def _encode_webp(image_data: bytes, webp_path: str) -> str:
+    """Convert raw image bytes to webp. Runs in a worker process."""
+    image = Image.open(io.BytesIO(image_data))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    image.save(webp_path, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+    return webp_path
+
+
+def _missing_covers(cover_urls) -> dict[str, str]:
+    """Map book_id -> cover_url for covers that have no local webp copy yet."""
+    missing = {}
+    for cover_url in cover_urls:
+        if not cover_url:
+            continue
+        book_id = extract_book_id(cover_url)
+        if not book_id or book_id in missing:
+            continue
+        if not _cover_image_path(book_id).exists():
+            missing[book_id] = cover_url
+    return missing
+
+
 def download_cover_image(cover_url: str) -> None:
     """
     Download cover_url and save it as a webp file under data/images.
     Skips the request entirely if a local copy already exists.
     """
-    if not cover_url:
-        return
+    for book_id, cover_url in _missing_covers([cover_url]).items():
+        webp_path = _cover_image_path(book_id)
+        try:
+            IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+            _encode_webp(_fetch_cover_image(cover_url), str(webp_path))
+            get_metrics().count("images_downloaded")
+            get_metrics().count("images_encoded")
+            logger.info("Downloaded and converted cover image: %s", webp_path.name)
+        except Exception as e:
+            get_metrics().count("images_failed")
+            logger.error("Failed to process cover image %s: %s", cover_url, e)
 
-    book_id = _extract_book_id(cover_url)
-    if not book_id:
-        return
 
-    webp_path = _cover_image_path(book_id)
-    if webp_path.exists():
-        return
-
-    try:
-        IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-        request = Request(cover_url, headers={"User-Agent": "Mozilla/5.0"})
-        with urlopen(request, timeout=30) as response:
-            image_data = response.read()
-        image = Image.open(io.BytesIO(image_data))
-        if image.mode not in ("RGB", "RGBA"):
-            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
-        image.save(webp_path, "WEBP")
-        logger.info("Downloaded and converted cover image: %s", webp_path.name)
-    except Exception as e:
-        logger.error("Failed to process cover image %s: %s", cover_url, e)
+def download_cover_images(cover_urls, download_workers: int = DOWNLOAD_WORKERS, encode_workers: int | None = None) -> int:
+    """
+    Batch version of download_cover_image() for a whole set of books.
+
+    Missing covers are downloaded on a thread pool, and every downloaded image is
+    handed straight to a process pool for webp encoding, so encoding runs on all
+    cores while other downloads are still in flight. Returns the number of covers saved.
+    """
+    missing = _missing_covers(cover_urls)
+    if not missing:
+        return 0
+
+    logger.info("Downloading %d missing cover images...", len(missing))
+    IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+
+    metrics = get_metrics()
+    saved = 0
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, ProcessPoolExecutor(
+        max_workers=encode_workers
+    ) as encoders:
+        download_futures = {downloads.submit(_fetch_cover_image, url): (book_id, url) for book_id, url in missing.items()}
+
+        encode_futures = {}
+        for future in as_completed(download_futures):
+            book_id, cover_url = download_futures[future]
+            try:
+                image_data = future.result()
+            except Exception as e:
+                metrics.count("images_failed")
+                logger.error("Failed to download cover image %s: %s", cover_url, e)
+                continue
+            metrics.count("images_downloaded")
+            webp_path = str(_cover_image_path(book_id))
+            encode_futures[encoders.submit(_encode_webp, image_data, webp_path)] = cover_url
+
+        for future in as_completed(encode_futures):
+            try:
+                webp_path = future.result()
+            except Exception as e:
+                metrics.count("images_failed")
+                logger.error("Failed to process cover image %s: %s", encode_futures[future], e)
+                continue
+            metrics.count("images_encoded")
+            saved += 1
+            logger.info("Downloaded and converted cover image: %s", pathlib.Path(webp_path).name)
+
+    return saved
+
+
+def _file_info(path: pathlib.Path, width: int, height: int) -> dict:
+    data = path.read_bytes()
+    return {
+        "width": width,
+        "height": height,
+        "bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def _encode_variants(source_path: str, variant_paths: dict[int, str]) -> dict:
+    """
+    Resize a full-size cover into all variant widths. Runs in a worker process.
+    Covers are never upscaled, so small originals get fewer variants.
+    """
+    with Image.open(source_path) as image:
+        image.load()
+    info = _file_info(pathlib.Path(source_path), image.width, image.height)
+
+    info["variants"] = {}
+    for width, variant_path in variant_paths.items():
+        if width >= image.width:
+            continue
+        height = round(image.height * width / image.width)
+        variant = image.resize((width, height), Image.Resampling.LANCZOS)
+        variant.save(variant_path, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+        info["variants"][str(width)] = _file_info(pathlib.Path(variant_path), width, height)
+
+    return info
+
+
+@functools.cache
+def load_manifest() -> dict:
+    """Cover manifest: book_id -> width, height, bytes and sha256 of the cover and each variant."""
+    if not MANIFEST_PATH.exists():
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _is_up_to_date(entry: dict | None, book_id: str, source_sha256: str) -> bool:
+    if not entry or entry["sha256"] != source_sha256:
+        return False
+    return all(_variant_image_path(book_id, int(width)).exists() for width in entry["variants"])
+
+
+def generate_cover_variants(encode_workers: int | None = None) -> int:
+    """
+    Generate resized webp variants for every cover under data/images and update manifest.json.
+
+    Covers whose content hash matches the manifest (and whose variants exist) are skipped,
+    the rest are encoded on a process pool. Returns the number of re-encoded covers.
+    """
+    manifest = dict(load_manifest())
+
+    pending = {}
+    existing_ids = set()
+    for source_path in IMAGES_DIR.glob("*.webp"):
+        book_id = source_path.stem
+        if not book_id.isdigit():
+            continue
+        existing_ids.add(book_id)
+        source_sha256 = hashlib.sha256(source_path.read_bytes()).hexdigest()
+        if not _is_up_to_date(manifest.get(book_id), book_id, source_sha256):
+            pending[book_id] = source_path
+
+    # Drop covers that were deleted
+    for book_id in set(manifest) - existing_ids:
+        del manifest[book_id]
+
+    if pending:
+        logger.info("Generating cover variants for %d images...", len(pending))
+        with ProcessPoolExecutor(max_workers=encode_workers) as encoders:
+            futures = {
+                encoders.submit(
+                    _encode_variants,
+                    str(source_path),
+                    {width: str(_variant_image_path(book_id, width)) for width in VARIANT_WIDTHS},
+                ): book_id
+                for book_id, source_path in pending.items()
+            }
+            for future in as_completed(futures):
+                book_id = futures[future]
+                try:
+                    manifest[book_id] = future.result()
+                except Exception as e:
+                    logger.error("Failed to generate variants for %s: %s", book_id, e)
+                    continue
+                get_metrics().count("variants_encoded", len(VARIANT_WIDTHS))
+
+    if write_json_if_changed(MANIFEST_PATH, manifest, indent=2, sort_keys=True):
+        load_manifest.cache_clear()
+
+    return len(pending)
 
 
 def process_cover_image(cover_url: str) -> str:
@@ -61,18 +242,41 @@ def process_cover_image(cover_url: str) -> str:
     and, if so, return the raw.githubusercontent.com URL pointing to it.
 
     Makes no network requests - relies only on the local filesystem. Call
-    download_cover_image() beforehand to actually fetch missing covers.
+    download_cover_image() or download_cover_images() beforehand to actually
+    fetch missing covers.
     Falls back to the original cover_url if no local copy exists.
     """
     if not cover_url:
         return cover_url
 
-    book_id = _extract_book_id(cover_url)
+    book_id = extract_book_id(cover_url)
     if not book_id:
         return cover_url
 
     webp_path = _cover_image_path(book_id)
-    if webp_path.exists():
-        return f"{GITHUB_IMAGES_BASE_URL}/{webp_path.name}"
+    if not webp_path.exists():
+        return cover_url
+
+    return f"{GITHUB_IMAGES_BASE_URL}/{webp_path.name}"
+
+
+def cover_image_srcset(cover_url: str) -> tuple[str | None, int | None, int | None]:
+    """
+    (srcset, width, height) of the local copy of this cover, from manifest.json:
+    `srcset` lists every variant plus the full-size cover, e.g.
+    ".../1-120w.webp 120w, .../1.webp 318w", width and height are the intrinsic size
+    of the full-size cover. All None when the cover has no variants (yet).
+
+    Call generate_cover_variants() beforehand.
+    """
+    book_id = extract_book_id(cover_url) if cover_url else None
+    entry = load_manifest().get(book_id) if book_id else None
+    if not entry:
+        return None, None, None
 
-    return cover_url
+    candidates = [
+        f"{GITHUB_IMAGES_BASE_URL}/{_variant_image_path(book_id, int(width)).name} {width}w"
+        for width in sorted(entry["variants"], key=int)
+    ]
+    candidates.append(f"{GITHUB_IMAGES_BASE_URL}/{_cover_image_path(book_id).name} {entry['width']}w")
+    return ", ".join(candidates), entry["width"], entry["height"]
@@ -1,23 +1,32 @@
-import json
+import argparse
 import logging
+import math
 import os
 import pathlib
-import re
+import sys
 import time
-from dataclasses import dataclass
-from datetime import datetime
+from urllib.parse import parse_qs, urlparse
 
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright, Page
-from enhased_json_decoder import EnhancedJSONEncoder
-from image_utils import download_cover_image, process_cover_image
+from playwright.sync_api import sync_playwright, Page, Route
+
+# Make the shared `ops` package importable when running as `python run.py`
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from bookshelf_parser import BACKENDS, DEFAULT_BACKEND, BookReview, ShelfPage, goodreads_base_url, parse_bookshelf_html  # noqa: E402
+from image_utils import cover_image_srcset, download_cover_images, generate_cover_variants, process_cover_image  # noqa: E402
+from ops.export import export_json  # noqa: E402
+from ops.json_encoder import EnhancedJSONEncoder  # noqa: E402
+from ops.metrics import get_metrics, run_job  # noqa: E402
+from ops.search_index import build_search_index  # noqa: E402
+from ops.output import write_json_if_changed  # noqa: E402
+from shelf_index import ShelfIndex  # noqa: E402
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
-goodreads_base_url = "https://www.goodreads.com"
 goodreads_login_url = f"{goodreads_base_url}/user/sign_in"
+goodreads_review_list_url = f"{goodreads_base_url}/review/list/"
 goodreads_read_first_page_url = f"{goodreads_base_url}/review/list/18740796-vadym-klymenko?shelf=read&per_page=100"
 goodreads_currently_reading_first_page_url = f"{goodreads_base_url}/review/list/18740796-vadym-klymenko?shelf=currently-reading&per_page=100"
 goodreads_own_first_page_url = f"{goodreads_base_url}/review/list/18740796-vadym-klymenko?shelf=own&per_page=100"
@@ -27,24 +36,25 @@ read_books_output_json_file = pathlib.Path(__file__).parent.resolve() / "data" /
 reading_now_output_json_file = pathlib.Path(__file__).parent.resolve() / "data" / "reading.json"
 top_rated_output_json_file = pathlib.Path(__file__).parent.resolve() / "data" / "top_rated.json"
 bookcrossing_output_json_file = pathlib.Path(__file__).parent.resolve() / "data" / "bookcrossing.json"
+# Minified + precompressed copies of the data files for the website
+export_dir = pathlib.Path(__file__).parent.resolve() / "export"
+
+# Goodreads shows 30 books per page unless per_page is given in the url
+DEFAULT_BOOKS_PER_PAGE = 30
+# Hosts that are never needed to read a shelf
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "amazon-adsystem.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+)
 
 GOODREADS_USERNAME = os.environ.get("GOODREADS_USERNAME")
 GOODREADS_PASSWORD = os.environ.get("GOODREADS_PASSWORD")
 
 
-@dataclass
-class BookReview:
-    title: str
-    author: str
-    cover_url: str
-    review_url: str
-    rating: int | None = None
-    date_started: datetime.date = None
-    date_read: datetime.date = None
-    is_reading_now: bool = False
-    own: bool = False
-
-
 def login_to_goodreads(page: Page) -> None:
     """
     Log in to Goodreads using email/password credentials.
@@ -79,222 +89,253 @@ def login_to_goodreads(page: Page) -> None:
     time.sleep(10)
 
 
-def process_bookshelf_page(page_content: BeautifulSoup, skip_unread: bool = True) -> list[BookReview]:
-    books_table = page_content.find('table', id='books')
-    books = []
-
-    if not books_table:
-        logger.warning("No books table found on page")
-        # Print table content
-        print(page_content)
-        return books
-
-    shelf_header = page_content.find('span', class_='h1Shelf')
-    is_current_reading_shelf = shelf_header and "Currently Reading" in shelf_header.text
-
-    for row in books_table.find_all('tr')[1:]:  # skip header
-        title_field = row.find('td', class_='field title')
-        if not title_field:
-            continue
-
-        title_link = title_field.find('a')
-        if not title_link:
-            continue
-
-        title = title_link.text.strip().replace("\n", " ")
-
-        author_field = row.find('td', class_='field author')
-        author = ""
-        if author_field:
-            author_link = author_field.find('a')
-            if author_link:
-                author = author_link.text
-                if author:
-                    # swap first and last name
-                    author = " ".join(reversed(author.split(","))).strip()
-
-        cover_url = ""
-        img = row.find('img')
-        if img and img.get("src"):
-            cover_url = img["src"]
-            # Replace small cover with big one
-            pattern = r"\._S[YX]\d+(_S[YX]\d+)?_\."
-            cover_url = re.sub(pattern, ".", cover_url)
-            download_cover_image(cover_url)
-            cover_url = process_cover_image(cover_url)
-
-        rating_field = row.find('td', class_='field rating')
-        rating = None
-        if rating_field:
-            # Find div with class class="stars", use data-rating property of this field
-            rating = len(rating_field.find_all('a', class_='star on')) or None
-
-        date_started = None
-        date_started_field = row.find('td', class_='field date_started')
-        if date_started_field:
-            date_started_value = date_started_field.find('span', class_='date_started_value')
-            if date_started_value:
-                date_started = date_str_to_date(date_started_value.text)
-
-        date_read = None
-        date_read_field = row.find('td', class_='field date_read')
-        if date_read_field:
-            date_read_value = date_read_field.find('span', class_='date_read_value')
-            if date_read_value:
-                date_read = date_str_to_date(date_read_value.text)
-
-        if skip_unread and not date_started and not date_read:
-            continue
-
-        review_url = ""
-        actions_field = row.find('td', class_='field actions')
-        if actions_field:
-            actions_link = actions_field.find('a', class_='actionLinkLite viewLink nobreak')
-            if actions_link and actions_link.get("href"):
-                review_url = f"{goodreads_base_url}{actions_link['href']}"
-
-        book = BookReview(
-            title=title,
-            author=author,
-            cover_url=cover_url,
-            rating=rating,
-            date_started=date_started,
-            date_read=date_read,
-            review_url=review_url,
-            is_reading_now=is_current_reading_shelf
-        )
-
-        books.append(book)
-
-    return books
-
-
-def date_str_to_date(date: str) -> datetime.date:
+class ResourceBlocker:
     """
-    Convert date string to datetime
+    Request router for the fast crawl mode.
 
-    :param date: Date in string format like Feb 08, 2023 or Feb 2023
-    :return: Date instance
+    Images, fonts, media and trackers are always blocked. Once documents_only is
+    set (after login), everything except the HTML documents themselves (and the
+    shelf pages fetched by fetch_pages()) is blocked, as shelf tables are rendered
+    on the server.
     """
-    if ", " not in date:
-        date_obj = datetime.strptime(date, "%b %Y").replace(day=1)
-    else:
-        date_obj = datetime.strptime(date, "%b %d, %Y")
-
-    return date_obj.date()
 
+    def __init__(self):
+        self.documents_only = False
+
+    def __call__(self, route: Route) -> None:
+        request = route.request
+        resource_type = request.resource_type
+        host = urlparse(request.url).hostname or ""
+
+        if any(host == blocked or host.endswith(f".{blocked}") for blocked in BLOCKED_HOSTS):
+            route.abort()
+        elif resource_type in ("image", "font", "media"):
+            route.abort()
+        elif self.documents_only and resource_type != "document" and not (
+            resource_type == "fetch" and request.url.startswith(goodreads_review_list_url)
+        ):
+            route.abort()
+        else:
+            route.continue_()
+
+
+def total_pages_count(url: str, total_books: int) -> int:
+    """Number of shelf pages, using the per_page value the url actually requests."""
+    per_page = parse_qs(urlparse(url).query).get("per_page", [DEFAULT_BOOKS_PER_PAGE])[0]
+    return max(math.ceil(total_books / int(per_page)), 1)
+
+
+# Runs in the logged in page: fetches urls with `concurrency` requests in flight and
+# returns [html, milliseconds] per url, in the order of urls
+_FETCH_PAGES_JS = """
+async ([urls, concurrency]) => {
+    const results = new Array(urls.length);
+    let next = 0;
+    async function worker() {
+        while (next < urls.length) {
+            const i = next++;
+            const start = performance.now();
+            const response = await fetch(urls[i], {credentials: "include"});
+            if (!response.ok) {
+                throw new Error(`${urls[i]} returned ${response.status}`);
+            }
+            results[i] = [await response.text(), performance.now() - start];
+        }
+    }
+    await Promise.all(Array.from({length: Math.min(concurrency, urls.length)}, worker));
+    return results;
+}
+"""
+
+
+def fetch_pages(page: Page, urls: list[str], concurrency: int) -> list[str]:
+    """
+    Fetch urls with up to `concurrency` requests at once from the (logged in) page and
+    return their contents in the order of urls.
 
-def parse_books(page: Page, url: str, skip_unread: bool = True) -> list[BookReview]:
+    Shelf tables are rendered on the server, so a plain fetch() with the session
+    cookies returns the same HTML as a navigation, without a tab per page.
+    """
+    logger.info("Fetching %d pages, %d at once", len(urls), concurrency)
+    metrics = get_metrics()
+    contents = []
+    for page_url, (content, latency_ms) in zip(urls, page.evaluate(_FETCH_PAGES_JS, [urls, concurrency])):
+        metrics.item("pages", page_url).update(latency=latency_ms / 1000)
+        contents.append(content)
+    return contents
+
+
+def parse_page(url: str, content: str, skip_unread: bool, backend: str) -> ShelfPage:
+    """parse_bookshelf_html() that records the page size and parse time in the run metrics."""
+    start = time.perf_counter()
+    shelf_page = parse_bookshelf_html(content, skip_unread, backend)
+    get_metrics().item("pages", url).update(
+        bytes=len(content.encode("utf-8")), parse_time=time.perf_counter() - start, books=len(shelf_page.books)
+    )
+    return shelf_page
+
+
+def parse_books(
+    page: Page,
+    url: str,
+    skip_unread: bool = True,
+    concurrency: int = 1,
+    wait_until: str = "networkidle",
+    backend: str = DEFAULT_BACKEND,
+) -> list[BookReview]:
     """
     Parse books from goodreads using Playwright
 
     :param page: Playwright page instance
     :param url: Url to parse
     :param skip_unread: Include unread books or not
+    :param concurrency: Number of remaining pages fetched at once
+    :param wait_until: Load state to wait for after each navigation
+    :param backend: HTML parsing backend, see bookshelf_parser.BACKENDS
     :return: List of books
     """
     logger.info("Processing url %s...", url)
-    page.goto(url)
-    page.wait_for_load_state("networkidle")
+    metrics = get_metrics()
+    start = time.perf_counter()
+    page.goto(url, wait_until=wait_until)
+    metrics.item("pages", url).update(latency=time.perf_counter() - start)
 
     books = []
 
     # Parse first page
-    content = page.content()
-    books_page_content = BeautifulSoup(content, 'html.parser')
-    books.extend(process_bookshelf_page(books_page_content, skip_unread))
+    first_page = parse_page(url, page.content(), skip_unread, backend)
+    books.extend(first_page.books)
 
     # Get total books count to calculate pages
-    shelf_header = books_page_content.find('span', class_='h1Shelf')
-    if shelf_header:
-        grey_text = shelf_header.find('span', class_='greyText')
-        if grey_text:
-            total_books = grey_text.text
-            total_books_match = re.search(r"\d+", total_books)
-            if total_books_match:
-                total_books_int = int(total_books_match.group())
-                total_pages = total_books_int // 30 + 1  # 30 books per page
-
-                # Parse remaining pages
-                for page_num in range(2, total_pages + 1):
-                    page_url = f"{url}&page={page_num}"
-                    logger.info("Processing page %d: %s", page_num, page_url)
-                    page.goto(page_url)
-                    page.wait_for_load_state("networkidle")
-
-                    content = page.content()
-                    books_page_content = BeautifulSoup(content, 'html.parser')
-                    books.extend(process_bookshelf_page(books_page_content, skip_unread))
+    if first_page.total_books is not None:
+        total_pages = total_pages_count(url, first_page.total_books)
+        page_urls = [f"{url}&page={page_num}" for page_num in range(2, total_pages + 1)]
+
+        # Parse remaining pages
+        if concurrency > 1 and page_urls:
+            contents = fetch_pages(page, page_urls, concurrency)
+        else:
+            contents = []
+            for page_url in page_urls:
+                logger.info("Processing page %s", page_url)
+                start = time.perf_counter()
+                page.goto(page_url, wait_until=wait_until)
+                metrics.item("pages", page_url).update(latency=time.perf_counter() - start)
+                contents.append(page.content())
+
+        for page_url, content in zip(page_urls, contents):
+            books.extend(parse_page(page_url, content, skip_unread, backend).books)
 
     return books
 
 
-def process():
+def resolve_cover_images(books: list[BookReview]) -> None:
+    """Download missing covers for all books at once and point cover_url (and the srcset) to the local copies."""
+    download_cover_images(book.cover_url for book in books)
+    generate_cover_variants()
+    for book in books:
+        book.cover_url = process_cover_image(book.cover_url)
+        book.cover_srcset, book.cover_width, book.cover_height = cover_image_srcset(book.cover_url)
+
+
+def process(fast: bool = False, concurrency: int = 4, backend: str = DEFAULT_BACKEND):
     """
     Process books from goodreads and write them to file
+
+    :param fast: Fast crawl mode - headless, resources blocked, remaining pages fetched concurrently
+    :param concurrency: Number of pages fetched at once in fast mode
+    :param backend: HTML parsing backend, see bookshelf_parser.BACKENDS
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)  # headless=True
+    metrics = get_metrics()
+    parse_options = {"backend": backend}
+    if fast:
+        parse_options.update(concurrency=concurrency, wait_until="domcontentloaded")
+
+    with metrics.phase("browse"), sync_playwright() as p:
+        browser = p.chromium.launch(headless=fast)
         context = browser.new_context(
             user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         )
+        resource_blocker = ResourceBlocker()
+        if fast:
+            context.route("**/*", resource_blocker)
         page = context.new_page()
 
         # Login to Goodreads
         login_to_goodreads(page)
+        resource_blocker.documents_only = True
 
         books = []
 
-        books.extend(parse_books(page, goodreads_currently_reading_first_page_url))
-        books.extend(parse_books(page, goodreads_read_first_page_url))
+        books.extend(parse_books(page, goodreads_currently_reading_first_page_url, **parse_options))
+        books.extend(parse_books(page, goodreads_read_first_page_url, **parse_options))
 
-        owning_books = parse_books(page, goodreads_own_first_page_url, skip_unread=False)
+        owning_books = parse_books(page, goodreads_own_first_page_url, skip_unread=False, **parse_options)
+        shelf_index = ShelfIndex({"own": owning_books})
         for book in books:
-            for owning_book in owning_books:
-                if owning_book.title == book.title and owning_book.author == book.author:
-                    book.own = True
-                    break
-
-        books.sort(key=lambda book: book.date_read or book.date_started, reverse=True)
-        # Move currently reading books to the top
-        books.sort(key=lambda book: book.is_reading_now, reverse=True)
-
-        logger.info("Books on goodreads: %s", len(books))
-        logger.info("Writing books to file...")
-
-        with open(read_books_output_json_file, 'w', encoding='utf-8') as f:
-            books_dict = {"books": books}
-            json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
-            f.write(json_str)
-
-        with open(top_rated_output_json_file, 'w', encoding='utf-8') as f:
-            top_rated_books = list(filter(lambda book: book.rating in [4, 5], books))
-            books_dict = {"books": top_rated_books}
-            json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
-            f.write(json_str)
-
-        with open(reading_now_output_json_file, 'w', encoding='utf-8') as f:
-            reading_books = list(filter(lambda book: book.is_reading_now, books))
-            books_dict = {"books": reading_books}
-            json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
-            f.write(json_str)
-
-        with open(bookcrossing_output_json_file, 'w', encoding='utf-8') as f:
-            bookcrossing_books = parse_books(page, goodreads_bookcrossing_first_page_url, skip_unread=False)
-            for book in bookcrossing_books:
-                for owning_book in owning_books:
-                    if owning_book.title == book.title and owning_book.author == book.author:
-                        book.own = True
-                        break
-
-            books_dict = {"books": bookcrossing_books}
-            json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
-            f.write(json_str)
+            if shelf_index.on_shelf(book, "own"):
+                book.own = True
+
+        bookcrossing_books = parse_books(page, goodreads_bookcrossing_first_page_url, skip_unread=False, **parse_options)
+        for book in bookcrossing_books:
+            if shelf_index.on_shelf(book, "own"):
+                book.own = True
 
         browser.close()
 
+    with metrics.phase("covers"):
+        resolve_cover_images(books + bookcrossing_books)
+
+    books.sort(key=lambda book: book.date_read or book.date_started, reverse=True)
+    # Move currently reading books to the top
+    books.sort(key=lambda book: book.is_reading_now, reverse=True)
+
+    logger.info("Books on goodreads: %s", len(books))
+    logger.info("Writing books to file...")
+
+    with metrics.phase("save"):
+        books_dict = {"books": books}
+        write_json_if_changed(read_books_output_json_file, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
+
+        top_rated_books = list(filter(lambda book: book.rating in [4, 5], books))
+        books_dict = {"books": top_rated_books}
+        write_json_if_changed(top_rated_output_json_file, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
+
+        reading_books = list(filter(lambda book: book.is_reading_now, books))
+        books_dict = {"books": reading_books}
+        write_json_if_changed(reading_now_output_json_file, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
+
+        books_dict = {"books": bookcrossing_books}
+        write_json_if_changed(bookcrossing_output_json_file, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
+
+        export_json(
+            export_dir,
+            {
+                read_books_output_json_file.name: {"books": books},
+                top_rated_output_json_file.name: {"books": top_rated_books},
+                reading_now_output_json_file.name: {"books": reading_books},
+                bookcrossing_output_json_file.name: {"books": bookcrossing_books},
+                # Doc ids are positions in read.json
+                "search.json": build_search_index(
+                    books, prefix_fields=("title", "author"), display_fields=("title", "author", "review_url")
+                ),
+            },
+            cls=EnhancedJSONEncoder,
+        )
+
     logger.info("Done!")
 
 
 if __name__ == '__main__':
-    process()
+    parser = argparse.ArgumentParser(description="Parse goodreads shelves with a real browser (fallback for run_rss.py)")
+    parser.add_argument("--fast", action="store_true", help="Headless crawl with blocked resources and concurrent page fetches")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of pages fetched at once in fast mode")
+    parser.add_argument("--parser", choices=BACKENDS, default=DEFAULT_BACKEND, help="HTML parsing backend")
+    parser.add_argument("--profile", action="store_true", help="Profile the run with cProfile")
+    args = parser.parse_args()
+    run_job(
+        "goodreads-browser",
+        lambda: process(fast=args.fast, concurrency=args.concurrency, backend=args.parser),
+        pathlib.Path(__file__).parent.resolve(),
+        profile=args.profile,
+    )
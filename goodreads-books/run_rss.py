@@ -1,16 +1,29 @@
+import argparse
 import json
 import logging
 import os
 import pathlib
 import re
+import sys
+import time
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from email.utils import parsedate_to_datetime
-from urllib.request import urlopen, Request
+from urllib.parse import quote
 
-from enhased_json_decoder import EnhancedJSONEncoder
-from image_utils import download_cover_image, process_cover_image
+# Make the shared `ops` package importable when running as `python run_rss.py`
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+
+from image_utils import cover_image_srcset, download_cover_images, extract_book_id, generate_cover_variants, process_cover_image  # noqa: E402
+from ops.http import get_client  # noqa: E402
+from ops.metrics import get_metrics, run_job  # noqa: E402
+from ops.export import export_json  # noqa: E402
+from ops.json_encoder import EnhancedJSONEncoder  # noqa: E402
+from ops.search_index import build_search_index  # noqa: E402
+from ops.output import write_json_if_changed  # noqa: E402
+from shelf_index import ShelfIndex  # noqa: E402
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -19,15 +32,34 @@ logger.setLevel(logging.DEBUG)
 # Configuration
 GOODREADS_USER_ID = "18740796"
 GOODREADS_RSS_KEY = os.environ.get("GOODREADS_RSS_KEY")
+# Set to re-download the whole read shelf regardless of the sync state
+GOODREADS_FULL_SYNC = bool(os.environ.get("GOODREADS_FULL_SYNC"))
+# Set to page through the #ALL# shelf once instead of fetching every shelf separately
+GOODREADS_ALL_SHELVES = bool(os.environ.get("GOODREADS_ALL_SHELVES"))
 
 RSS_BASE_URL = f"https://www.goodreads.com/review/list_rss/{GOODREADS_USER_ID}"
 
+# Pagination: pages requested in parallel per shelf, and the safety limit
+PAGE_WINDOW = 3
+MAX_PAGES = 50
+
+# Pseudo-shelf with the books of every shelf, each item lists its shelves in user_shelves
+ALL_SHELF = "#ALL#"
+# A book is on exactly one of these; books of the read shelf may list none of them
+EXCLUSIVE_SHELVES = {"read", "currently-reading", "to-read"}
+
+# Incremental sync of the read shelf is checked against a full resync this often
+FULL_RESYNC_INTERVAL = timedelta(days=7)
+
 # Output files
 data_dir = pathlib.Path(__file__).parent.resolve() / "data"
 read_books_output_json_file = data_dir / "read.json"
 reading_now_output_json_file = data_dir / "reading.json"
 top_rated_output_json_file = data_dir / "top_rated.json"
 bookcrossing_output_json_file = data_dir / "bookcrossing.json"
+sync_state_json_file = data_dir / "sync_state.json"
+# Minified + precompressed copies of the data files for the website
+export_dir = pathlib.Path(__file__).parent.resolve() / "export"
 
 
 @dataclass
@@ -41,19 +73,23 @@ class BookReview:
     date_read: date = None
     is_reading_now: bool = False
     own: bool = False
+    # Responsive variants and intrinsic size of the local cover, see image_utils.cover_image_srcset()
+    cover_srcset: str | None = None
+    cover_width: int | None = None
+    cover_height: int | None = None
 
 
 def build_rss_url(shelf: str, page: int = 1) -> str:
     """Build RSS feed URL for a specific shelf and page."""
-    return f"{RSS_BASE_URL}?key={GOODREADS_RSS_KEY}&shelf={shelf}&page={page}"
+    return f"{RSS_BASE_URL}?key={GOODREADS_RSS_KEY}&shelf={quote(shelf)}&page={page}"
 
 
 def fetch_rss(url: str) -> str:
     """Fetch RSS feed content from URL."""
     logger.debug("Fetching RSS: %s", url)
-    request = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urlopen(request, timeout=30) as response:
-        return response.read().decode("utf-8")
+    response = get_client().get(url)
+    response.raise_for_status()
+    return response.content.decode("utf-8")
 
 
 def parse_rfc2822_date(date_str: str) -> date | None:
@@ -67,8 +103,20 @@ def parse_rfc2822_date(date_str: str) -> date | None:
         return None
 
 
-def parse_book_from_item(item: ET.Element, is_currently_reading: bool = False) -> BookReview | None:
-    """Parse a single book item from RSS XML."""
+def parse_user_shelves(item: ET.Element) -> set[str]:
+    """Shelves of an RSS item, from its comma separated user_shelves."""
+    elem = item.find("user_shelves")
+    if elem is None or not elem.text:
+        return set()
+    return {shelf.strip().lower() for shelf in elem.text.split(",") if shelf.strip()}
+
+
+def parse_book_from_item(item: ET.Element, is_currently_reading: bool | None = False) -> BookReview | None:
+    """
+    Parse a single book item from RSS XML.
+
+    With is_currently_reading=None it is taken from the item's user_shelves (for ALL_SHELF).
+    """
 
     def get_text(tag: str) -> str:
         elem = item.find(tag)
@@ -87,12 +135,11 @@ def parse_book_from_item(item: ET.Element, is_currently_reading: bool = False) -
     if not cover_url or "nophoto" in cover_url:
         cover_url = get_text("book_image_url")
 
-    # Clean up cover URL - remove size modifiers for highest quality
+    # Clean up cover URL - remove size modifiers for highest quality.
+    # Local copies are resolved later by resolve_cover_images(), so parsing never waits on images.
     if cover_url:
         pattern = r"\._S[YX]\d+(_S[YX]\d+)?_\."
         cover_url = re.sub(pattern, ".", cover_url)
-        download_cover_image(cover_url)
-        cover_url = process_cover_image(cover_url)
 
     review_url = get_text("link")
     # Remove query params from review URL
@@ -103,6 +150,10 @@ def parse_book_from_item(item: ET.Element, is_currently_reading: bool = False) -
     rating_str = get_text("user_rating")
     rating = int(rating_str) if rating_str and rating_str != "0" else None
 
+    user_shelves = parse_user_shelves(item)
+    if is_currently_reading is None:
+        is_currently_reading = "currently-reading" in user_shelves
+
     # Parse dates
     date_read = parse_rfc2822_date(get_text("user_read_at"))
 
@@ -112,8 +163,7 @@ def parse_book_from_item(item: ET.Element, is_currently_reading: bool = False) -
         date_started = parse_rfc2822_date(get_text("user_date_added"))
 
     # Check if book is owned (from user_shelves)
-    user_shelves = get_text("user_shelves")
-    own = "own" in user_shelves.lower().split(", ") if user_shelves else False
+    own = "own" in user_shelves
 
     return BookReview(
         title=title,
@@ -128,63 +178,141 @@ def parse_book_from_item(item: ET.Element, is_currently_reading: bool = False) -
     )
 
 
-def fetch_shelf(shelf: str, is_currently_reading: bool = False, skip_unread: bool = True) -> list[BookReview]:
+def book_fingerprint(book: BookReview) -> tuple:
+    """Fields that identify a book version on a shelf (cover compared by book id, ownership ignored)."""
+    return (
+        book.review_url,
+        extract_book_id(book.cover_url) if book.cover_url else None,
+        book.title,
+        book.author,
+        book.rating,
+        book.date_started,
+        book.date_read,
+    )
+
+
+def fetch_shelf(
+    shelf: str,
+    is_currently_reading: bool = False,
+    skip_unread: bool = True,
+    known: dict[str, tuple] | None = None,
+    page_window: int = PAGE_WINDOW,
+    shelves: dict[str, set[str]] | None = None,
+) -> list[BookReview]:
     """
     Fetch all books from a shelf, handling pagination.
 
+    Pages are requested speculatively in windows of page_window parallel requests,
+    but processed strictly in page order, stopping at the first empty (or failed) page.
+
     Args:
         shelf: Shelf name (read, currently-reading, own, bookcrossing, etc.)
-        is_currently_reading: Mark books as currently reading
+        is_currently_reading: Mark books as currently reading (None: by their user_shelves)
         skip_unread: Skip books without date_read or date_started
+        known: review_url -> book_fingerprint() of already synced books. Paging stops
+            after the first page whose kept books are all known and unchanged.
+        page_window: Number of pages requested in parallel
+        shelves: If given, review_url -> user_shelves of every fetched book is collected into it
 
     Returns:
         List of BookReview objects
     """
     books = []
     page = 1
-
-    while True:
-        url = build_rss_url(shelf, page)
-        logger.info("Fetching shelf '%s' page %d...", shelf, page)
-
-        try:
-            content = fetch_rss(url)
-        except Exception as e:
-            logger.error("Failed to fetch page %d: %s", page, e)
-            break
-
-        root = ET.fromstring(content)
-        items = root.findall(".//item")
-
-        if not items:
-            logger.info("No more items on page %d, stopping", page)
-            break
-
-        logger.info("Found %d items on page %d", len(items), page)
-
-        for item in items:
-            book = parse_book_from_item(item, is_currently_reading)
-            if book:
-                if skip_unread and not book.date_started and not book.date_read:
-                    continue
-                books.append(book)
-
-        page += 1
-
-        # Safety limit
-        if page > 50:
+    metrics = get_metrics()
+
+    def fetch_page(page_num: int) -> str:
+        logger.info("Fetching shelf '%s' page %d...", shelf, page_num)
+        start = time.perf_counter()
+        content = fetch_rss(build_rss_url(shelf, page_num))
+        metrics.item("pages", f"{shelf}/{page_num}").update(latency=time.perf_counter() - start, bytes=len(content))
+        return content
+
+    with ThreadPoolExecutor(max_workers=page_window) as executor:
+        while page <= MAX_PAGES:
+            window = range(page, min(page + page_window, MAX_PAGES + 1))
+            futures = [executor.submit(fetch_page, page_num) for page_num in window]
+
+            finished = False
+            for page_num, future in zip(window, futures):
+                try:
+                    content = future.result()
+                except Exception as e:
+                    logger.error("Failed to fetch page %d: %s", page_num, e)
+                    metrics.item("pages", f"{shelf}/{page_num}").update(error=str(e))
+                    finished = True
+                    break
+
+                parse_start = time.perf_counter()
+                root = ET.fromstring(content)
+                items = root.findall(".//item")
+                page_metrics = metrics.item("pages", f"{shelf}/{page_num}")
+
+                if not items:
+                    logger.info("No more items on page %d, stopping", page_num)
+                    page_metrics.update(items=0)
+                    finished = True
+                    break
+
+                logger.info("Found %d items on page %d", len(items), page_num)
+
+                page_books = []
+                for item in items:
+                    book = parse_book_from_item(item, is_currently_reading)
+                    if book:
+                        if shelves is not None:
+                            shelves[book.review_url] = parse_user_shelves(item)
+                        if skip_unread and not book.date_started and not book.date_read:
+                            continue
+                        page_books.append(book)
+                books.extend(page_books)
+                page_metrics.update(
+                    parse_time=time.perf_counter() - parse_start,
+                    items=len(items),
+                    kept=len(page_books),
+                    dropped=len(items) - len(page_books),
+                )
+
+                # Only kept books ever reach `known`, skipped (undated) ones are not compared
+                if (
+                    known is not None
+                    and page_books
+                    and all(known.get(b.review_url) == book_fingerprint(b) for b in page_books)
+                ):
+                    logger.info("Page %d has only already synced books, stopping", page_num)
+                    finished = True
+                    break
+
+            if finished:
+                for future in futures:
+                    future.cancel()
+                break
+
+            page += len(window)
+        else:
+            # Safety limit
             logger.warning("Reached page limit, stopping")
-            break
 
     return books
 
 
-def fetch_read_shelf() -> list[BookReview]:
-    """Fetch books from the 'read' shelf."""
+def fetch_read_shelf(previous_books: list[BookReview] | None = None) -> list[BookReview]:
+    """
+    Fetch books from the 'read' shelf.
+
+    With previous_books (the read books from the last run), only the top of the shelf
+    is fetched until a page with nothing new, and the rest is taken from previous_books.
+    """
     logger.info("=" * 50)
-    logger.info("FETCHING READ SHELF")
+    logger.info("FETCHING READ SHELF (%s)", "full" if previous_books is None else "incremental")
     logger.info("=" * 50)
-    books = fetch_shelf("read", is_currently_reading=False, skip_unread=True)
+    if previous_books is None:
+        books = fetch_shelf("read", is_currently_reading=False, skip_unread=True)
+    else:
+        known = {book.review_url: book_fingerprint(book) for book in previous_books}
+        books = fetch_shelf("read", is_currently_reading=False, skip_unread=True, known=known, page_window=1)
+        fetched_urls = {book.review_url for book in books}
+        books.extend(book for book in previous_books if book.review_url not in fetched_urls)
     logger.info("Total read books: %d", len(books))
     return books
 
@@ -219,37 +347,148 @@ def fetch_bookcrossing_shelf() -> list[BookReview]:
     return books
 
 
-def mark_owned_books(books: list[BookReview], owned_books: list[BookReview]) -> None:
-    """Mark books as owned if they appear in the owned_books list."""
-    owned_set = {(b.title, b.author) for b in owned_books}
+def fetch_all_shelves() -> tuple[list[BookReview], list[BookReview], list[BookReview], list[BookReview]]:
+    """
+    Fetch the ALL_SHELF pseudo-shelf once and partition it by user_shelves.
+
+    Returns currently reading, read, own and bookcrossing books like the per-shelf
+    fetches do. A book on several shelves is the same BookReview object in every list.
+    """
+    logger.info("=" * 50)
+    logger.info("FETCHING ALL SHELVES")
+    logger.info("=" * 50)
+    shelves: dict[str, set[str]] = {}
+    books = fetch_shelf(ALL_SHELF, is_currently_reading=None, skip_unread=False, shelves=shelves)
+
+    currently_reading, read_books, owned_books, bookcrossing_books = [], [], [], []
+    for book in books:
+        book_shelves = shelves[book.review_url]
+        if book.is_reading_now:
+            currently_reading.append(book)
+        elif ("read" in book_shelves or not book_shelves & EXCLUSIVE_SHELVES) and (book.date_started or book.date_read):
+            read_books.append(book)
+        if "own" in book_shelves:
+            owned_books.append(book)
+        if "bookcrossing" in book_shelves:
+            bookcrossing_books.append(book)
+
+    logger.info(
+        "Total books: %d (%d currently reading, %d read, %d owned, %d bookcrossing)",
+        len(books), len(currently_reading), len(read_books), len(owned_books), len(bookcrossing_books),
+    )
+    get_metrics().count("books", len(books))
+    return currently_reading, read_books, owned_books, bookcrossing_books
+
+
+def resolve_cover_images(*shelves: list[BookReview]) -> None:
+    """Download missing covers for all books at once and point cover_url (and the srcset) to the local copies."""
+    # A book may be on several shelves, resolve it once
+    books = list({id(book): book for shelf in shelves for book in shelf}.values())
+    download_cover_images(book.cover_url for book in books)
+    generate_cover_variants()
+    for book in books:
+        book.cover_url = process_cover_image(book.cover_url)
+        book.cover_srcset, book.cover_width, book.cover_height = cover_image_srcset(book.cover_url)
+
+
+def mark_owned_books(books: list[BookReview], shelf_index: ShelfIndex) -> None:
+    """Mark books as owned if they are on the own shelf of shelf_index."""
     for book in books:
-        if (book.title, book.author) in owned_set:
+        if shelf_index.on_shelf(book, "own"):
             book.own = True
 
 
+def load_books(filepath: pathlib.Path) -> list[BookReview]:
+    """Load books saved by save_books()."""
+    if not filepath.exists():
+        return []
+
+    with open(filepath, "r", encoding="utf-8") as f:
+        books_dict = json.load(f)
+
+    books = []
+    for book in books_dict["books"]:
+        for field in ("date_started", "date_read"):
+            if book[field]:
+                book[field] = date.fromisoformat(book[field])
+        books.append(BookReview(**book))
+    return books
+
+
+def load_sync_state() -> dict:
+    if not sync_state_json_file.exists():
+        return {}
+    with open(sync_state_json_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_sync_state(state: dict) -> None:
+    # State, not an output: last_full_sync alone is not worth a commit. It is committed along
+    # with the next book change, until then a run at worst does a full sync again.
+    write_json_if_changed(sync_state_json_file, state, output=False, indent=2)
+
+
+def is_full_sync_due(state: dict) -> bool:
+    if GOODREADS_FULL_SYNC or not state.get("last_full_sync"):
+        return True
+    return date.today() - date.fromisoformat(state["last_full_sync"]) >= FULL_RESYNC_INTERVAL
+
+
 def save_books(books: list[BookReview], filepath: pathlib.Path) -> None:
-    """Save books to JSON file."""
-    with open(filepath, "w", encoding="utf-8") as f:
-        books_dict = {"books": books}
-        json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
-        f.write(json_str)
-    logger.info("Saved %d books to %s", len(books), filepath.name)
-
-
-def process():
-    """Process all shelves and save to JSON files."""
-    # Fetch each shelf separately for debugging
-    currently_reading = fetch_currently_reading_shelf()
-    read_books = fetch_read_shelf()
-    owned_books = fetch_own_shelf()
-    bookcrossing_books = fetch_bookcrossing_shelf()
+    """Save books to JSON file (only rewritten when the content changed)."""
+    books_dict = {"books": books}
+    changed = write_json_if_changed(filepath, books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=2)
+    logger.info("Saved %d books to %s%s", len(books), filepath.name, "" if changed else " (unchanged)")
+
+
+def process(all_shelves: bool = GOODREADS_ALL_SHELVES):
+    """
+    Process all shelves and save to JSON files.
+
+    :param all_shelves: Fetch ALL_SHELF once instead of every shelf separately (always a full sync)
+    """
+    metrics = get_metrics()
+    sync_state = load_sync_state()
+    full_sync = all_shelves or is_full_sync_due(sync_state)
+
+    previous_read_books = None
+    if not full_sync:
+        previous_read_books = [b for b in load_books(read_books_output_json_file) if not b.is_reading_now]
+        # Ownership is recomputed from the own shelf below
+        for book in previous_read_books:
+            book.own = False
+
+    if all_shelves:
+        with metrics.phase("fetch_shelves"):
+            currently_reading, read_books, owned_books, bookcrossing_books = fetch_all_shelves()
+    else:
+        # Fetch all shelves concurrently
+        with metrics.phase("fetch_shelves"), ThreadPoolExecutor(max_workers=4) as executor:
+            currently_reading_future = executor.submit(fetch_currently_reading_shelf)
+            read_books_future = executor.submit(fetch_read_shelf, previous_read_books)
+            owned_books_future = executor.submit(fetch_own_shelf)
+            bookcrossing_books_future = executor.submit(fetch_bookcrossing_shelf)
+
+        currently_reading = currently_reading_future.result()
+        read_books = read_books_future.result()
+        owned_books = owned_books_future.result()
+        bookcrossing_books = bookcrossing_books_future.result()
+
+    if not full_sync:
+        # A book that was moved back to currently-reading is no longer on the read shelf
+        reading_urls = {book.review_url for book in currently_reading}
+        read_books = [book for book in read_books if book.review_url not in reading_urls]
+
+    with metrics.phase("covers"):
+        resolve_cover_images(currently_reading, read_books, owned_books, bookcrossing_books)
 
     # Combine currently reading and read books
     all_books = currently_reading + read_books
 
     # Mark ownership
-    mark_owned_books(all_books, owned_books)
-    mark_owned_books(bookcrossing_books, owned_books)
+    shelf_index = ShelfIndex({"own": owned_books})
+    mark_owned_books(all_books, shelf_index)
+    mark_owned_books(bookcrossing_books, shelf_index)
 
     # Sort: by date (newest first), then currently reading at top
     all_books.sort(key=lambda b: b.date_read or b.date_started or date.min, reverse=True)
@@ -259,22 +498,56 @@ def process():
     logger.info("SAVING OUTPUT FILES")
     logger.info("=" * 50)
 
-    # Save all read/reading books
-    save_books(all_books, read_books_output_json_file)
-
-    # Save top rated (4-5 stars)
-    top_rated = [b for b in all_books if b.rating in (4, 5)]
-    save_books(top_rated, top_rated_output_json_file)
-
-    # Save currently reading
-    reading_only = [b for b in all_books if b.is_reading_now]
-    save_books(reading_only, reading_now_output_json_file)
-
-    # Save bookcrossing
-    save_books(bookcrossing_books, bookcrossing_output_json_file)
+    with metrics.phase("save"):
+        # Save all read/reading books
+        save_books(all_books, read_books_output_json_file)
+
+        # Save top rated (4-5 stars)
+        top_rated = [b for b in all_books if b.rating in (4, 5)]
+        save_books(top_rated, top_rated_output_json_file)
+
+        # Save currently reading
+        reading_only = [b for b in all_books if b.is_reading_now]
+        save_books(reading_only, reading_now_output_json_file)
+
+        # Save bookcrossing
+        save_books(bookcrossing_books, bookcrossing_output_json_file)
+
+        export_json(
+            export_dir,
+            {
+                read_books_output_json_file.name: {"books": all_books},
+                top_rated_output_json_file.name: {"books": top_rated},
+                reading_now_output_json_file.name: {"books": reading_only},
+                bookcrossing_output_json_file.name: {"books": bookcrossing_books},
+                # Doc ids are positions in read.json
+                "search.json": build_search_index(
+                    all_books, prefix_fields=("title", "author"), display_fields=("title", "author", "review_url")
+                ),
+            },
+            cls=EnhancedJSONEncoder,
+        )
+
+    if full_sync:
+        sync_state["last_full_sync"] = date.today().isoformat()
+        save_sync_state(sync_state)
 
     logger.info("Done!")
 
 
 if __name__ == "__main__":
-    process()
+    parser = argparse.ArgumentParser(description="Sync Goodreads shelves via RSS")
+    parser.add_argument(
+        "--all-shelves",
+        action="store_true",
+        default=GOODREADS_ALL_SHELVES,
+        help=f"Fetch the {ALL_SHELF} shelf once and split it by user_shelves instead of fetching every shelf",
+    )
+    parser.add_argument("--profile", action="store_true", help="Profile the run with cProfile")
+    args = parser.parse_args()
+    run_job(
+        "goodreads-rss",
+        lambda: process(all_shelves=args.all_shelves),
+        pathlib.Path(__file__).parent.resolve(),
+        profile=args.profile,
+    )
@@ -0,0 +1,69 @@
+import re
+from typing import Iterable
+
+from image_utils import extract_book_id
+from ops.search_index import tokenize
+
+_REVIEW_ID_PATTERN = re.compile(r"/review/show/(\d+)")
+# "Title (Series, #2)" and "Title: Subtitle" differ between editions of the same book
+_SERIES_PATTERN = re.compile(r"\s*\([^)]*\)\s*$")
+
+
+def review_id(review_url: str) -> str | None:
+    match = _REVIEW_ID_PATTERN.search(review_url or "")
+    return match.group(1) if match else None
+
+
+def title_author_key(title: str, author: str) -> tuple:
+    """Normalised (title, author): series and subtitle dropped, author name parts in any order."""
+    title = _SERIES_PATTERN.sub("", title or "").split(":", 1)[0]
+    return " ".join(tokenize(title)), tuple(sorted(tokenize(author)))
+
+
+def book_keys(book) -> list[tuple]:
+    """
+    Keys a book is found by: the review id (one review per book, the same on every
+    shelf) and the Goodreads book id of its cover. Only a book with neither is keyed
+    by title_author_key(), which is too loose otherwise ("Sapiens: A Brief History"
+    and "Sapiens: A Graphic History" share it).
+    """
+    keys = []
+    if book_review_id := review_id(book.review_url):
+        keys.append(("review", book_review_id))
+    if book.cover_url and (book_id := extract_book_id(book.cover_url)):
+        keys.append(("book", book_id))
+    if not keys:
+        title, author = title_author_key(book.title, book.author)
+        if title:
+            keys.append(("title", title, author))
+    return keys
+
+
+class ShelfIndex:
+    """
+    Which shelves a book is on, for books of any shelf of either scraper
+    (bookshelf_parser.BookReview and run_rss.BookReview have the same fields).
+
+    Every book is indexed under all of its book_keys(), so a lookup is a few dict
+    hits instead of a scan of the shelf, and an edition with a slightly different
+    title is still matched by its review or book id.
+    """
+
+    def __init__(self, shelves: dict[str, Iterable] | None = None):
+        self._shelves: dict[tuple, set[str]] = {}
+        for shelf, books in (shelves or {}).items():
+            self.add(shelf, books)
+
+    def add(self, shelf: str, books: Iterable) -> None:
+        for book in books:
+            for key in book_keys(book):
+                self._shelves.setdefault(key, set()).add(shelf)
+
+    def shelves(self, book) -> set[str]:
+        shelves = set()
+        for key in book_keys(book):
+            shelves |= self._shelves.get(key, set())
+        return shelves
+
+    def on_shelf(self, book, shelf: str) -> bool:
+        return any(shelf in self._shelves.get(key, ()) for key in book_keys(book))
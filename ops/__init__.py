@@ -0,0 +1 @@
+"""Code shared between the ops scripts (blogroll, uasubstack, goodreads-books, reeder)."""
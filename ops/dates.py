@@ -0,0 +1,10 @@
+import calendar
+import time
+
+
+def struct_time_to_timestamp(st: time.struct_time) -> int:
+    """
+    Convert a struct_time to a Unix timestamp. feedparser's *_parsed values are UTC,
+    a tm_gmtoff (when present) is taken into account.
+    """
+    return calendar.timegm(st) - (getattr(st, "tm_gmtoff", None) or 0)
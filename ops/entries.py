@@ -0,0 +1,63 @@
+import dataclasses
+from typing import Optional
+
+from ops.dates import struct_time_to_timestamp
+
+
+@dataclasses.dataclass(slots=True)
+class FeedEntry:
+    """
+    A feed entry as the scripts keep it: only the fields they output, with the
+    publication time normalised once into `published_ts` (Unix timestamp, UTC),
+    which is what sorting and filtering use.
+
+    Build it with from_feedparser() right after a feed is parsed, so the feedparser
+    entry (with its full content HTML) can be dropped right away.
+    """
+
+    title: str
+    url: str
+    published: str
+    published_ts: int
+
+    channel_title: Optional[str] = None
+    channel_url: Optional[str] = None
+    channel_logo: Optional[str] = None
+
+    @classmethod
+    def from_feedparser(cls, entry, **channel) -> Optional["FeedEntry"]:
+        """FeedEntry of a feedparser entry, None when it has no title, link or parsable date."""
+        published_parsed = entry.get("published_parsed")
+        if not entry.get("title") or not entry.get("link") or not published_parsed:
+            return None
+        return cls(
+            title=entry.title,
+            url=entry.link,
+            published=entry.get("published", ""),
+            published_ts=struct_time_to_timestamp(published_parsed),
+            **channel,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "channel_title": self.channel_title,
+            "channel_url": self.channel_url,
+            "channel_logo": self.channel_logo,
+            "title": self.title,
+            "url": self.url,
+            "published": self.published,
+        }
+
+
+def sort_key(entry: FeedEntry) -> int:
+    return entry.published_ts
+
+
+def entries_from_feed(feed, **channel) -> list[FeedEntry]:
+    """FeedEntry of every usable entry of a parsed feed, in feed order."""
+    entries = []
+    for feed_entry in feed.entries:
+        entry = FeedEntry.from_feedparser(feed_entry, **channel)
+        if entry is not None:
+            entries.append(entry)
+    return entries
@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import json
+import logging
+import pathlib
+
+from ops.output import write_if_changed
+
+try:
+    import brotli
+except ImportError:  # optional, only the .br variants are skipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+
+def _gzip(data: bytes) -> bytes:
+    # mtime=0 keeps the output byte-identical between runs, so unchanged exports are not rewritten
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def export_json(export_dir: pathlib.Path, outputs: dict[str, object], **dumps_kwargs) -> dict:
+    """
+    Write every `name: data` of outputs to export_dir as minified JSON, together with
+    precompressed `name.gz` and `name.br` variants, so the website can serve them
+    without compressing at runtime. Compression uses the maximum levels, it's done
+    once per build.
+
+    Also writes export_dir/manifest.json with sizes and a content hash per file
+    (for cache-busting) and returns it.
+    """
+    if brotli is None:
+        logger.warning("brotli is not installed, skipping .br exports")
+
+    files = {}
+    for name, data in outputs.items():
+        content = json.dumps(data, ensure_ascii=False, separators=(",", ":"), **dumps_kwargs).encode("utf-8")
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        write_if_changed(export_dir / name, content)
+        gzipped = _gzip(content)
+        write_if_changed(export_dir / f"{name}.gz", gzipped)
+
+        info = {
+            "size": len(content),
+            "gzip_size": len(gzipped),
+            "sha256": sha256,
+            "version": sha256[:12],
+        }
+        if brotli is not None:
+            brotlied = brotli.compress(content, quality=BROTLI_QUALITY)
+            write_if_changed(export_dir / f"{name}.br", brotlied)
+            info["br_size"] = len(brotlied)
+
+        files[name] = info
+        logger.info(
+            "Exported %s: %d bytes, %d gzip, %s br",
+            name, info["size"], info["gzip_size"], info.get("br_size", "-"),
+        )
+
+    manifest = {"files": files}
+    write_if_changed(export_dir / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
@@ -0,0 +1,204 @@
+import datetime
+import json
+import logging
+import pathlib
+import threading
+import time
+
+import feedparser
+
+from ops.feed_schedule import PollSchedule
+from ops.feed_stream import parse_recent
+from ops.http import get_client
+from ops.metrics import get_metrics
+from ops.output import write_json_if_changed
+
+logger = logging.getLogger(__name__)
+
+# Only these fields are used by the scripts, so only these are persisted
+ENTRY_FIELDS = ("title", "link", "published")
+
+# (url, limit) -> (feed, cache record) of every feed fetched by any FeedCache in this
+# process, so jobs running together (see ops.runner) fetch a feed they share only once
+_fetched: dict[tuple[str, int | None], tuple[feedparser.FeedParserDict, dict]] = {}
+_fetched_lock = threading.Lock()
+
+
+def forget_fetched_feeds() -> None:
+    """Make the next FeedCache.parse() of every feed request it again (e.g. between benchmark runs)."""
+    with _fetched_lock:
+        _fetched.clear()
+
+
+class FeedCache:
+    """
+    Persistent HTTP validator cache for RSS/Atom feeds.
+
+    For every feed URL it stores the ETag / Last-Modified validators together
+    with the last parsed entries. The next request is sent as a conditional GET
+    and, when the server answers 304 Not Modified, the cached entries are
+    returned instead of downloading and parsing the feed again.
+
+    A feed already fetched in this process (by any FeedCache) is not requested again.
+
+    With a schedule, feeds that are not due yet (see PollSchedule) are not requested
+    at all, their last known entries are returned.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        max_entries: int = 20,
+        timeout: int = 30,
+        schedule: PollSchedule | None = None,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.schedule = schedule
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.shared = 0
+        self.skipped = 0
+
+        self._lock = threading.Lock()
+        self._feeds: dict[str, dict] = {}
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                self._feeds = json.load(f).get("feeds", {})
+
+    def parse(
+        self,
+        url: str,
+        request_headers: dict | None = None,
+        limit: int | None = None,
+        cutoff: datetime.datetime | None = None,
+    ) -> feedparser.FeedParserDict:
+        """
+        Fetch and parse url like feedparser.parse() does, reusing cached entries on 304.
+
+        With `limit` set, the response is parsed by the streaming parser, which stops
+        reading once it has `limit` entries newer than `cutoff` (see feed_stream.parse_recent).
+        """
+        with _fetched_lock:
+            fetched = _fetched.get((url, limit))
+        if fetched:
+            feed, record = fetched
+            with self._lock:
+                self.shared += 1
+                self._feeds[url] = record
+            get_metrics().item("feeds", url).update(cache="shared", entries=len(feed.entries))
+            return feed
+
+        cached = self._feeds.get(url)
+        if cached and self.schedule and not self.schedule.is_due(cached.get("schedule")):
+            with self._lock:
+                self.skipped += 1
+            get_metrics().item("feeds", url).update(cache="skipped", entries=len(cached["entries"]))
+            return self._from_cache(cached)
+
+        headers = {"User-Agent": feedparser.USER_AGENT}
+        headers.update(request_headers or {})
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+        feed_metrics = get_metrics().item("feeds", url)
+        start = time.perf_counter()
+        try:
+            with get_client().get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                feed_metrics.update(status=response.status_code, latency=time.perf_counter() - start)
+                if response.status_code == 304 and cached:
+                    with self._lock:
+                        self.hits += 1
+                    feed_metrics.update(cache="hit", entries=len(cached["entries"]))
+                    feed = self._from_cache(cached)
+                    PollSchedule.observe(cached.setdefault("schedule", {}), feed.entries)
+                    with _fetched_lock:
+                        _fetched[(url, limit)] = (feed, cached)
+                    return feed
+                response.raise_for_status()
+
+                response_headers = {"content-location": url}
+                response_headers.update((k.lower(), v) for k, v in response.headers.items())
+                if limit is None:
+                    feed = feedparser.parse(response.content, response_headers=response_headers)
+                else:
+                    # Read the body lazily (and un-gzipped) so parsing can stop early
+                    response.raw.decode_content = True
+                    feed = parse_recent(response.raw, limit=limit, cutoff=cutoff, response_headers=response_headers)
+                feed["status"] = response.status_code
+                # Bytes actually read from the network (the streaming parser may stop early)
+                feed_metrics.update(
+                    cache="miss",
+                    bytes=response.raw.tell(),
+                    parse_time=time.perf_counter() - start - feed_metrics["latency"],
+                    entries=len(feed.entries),
+                )
+        except Exception as e:
+            feed_metrics.update(cache="error", error=str(e))
+            return self._error(url, e)
+
+        record = {
+            "etag": response_headers.get("etag"),
+            "last_modified": response_headers.get("last-modified"),
+            "feed": {"title": feed.feed.get("title")},
+            "entries": [self._serialize_entry(entry) for entry in feed.entries[: self.max_entries]],
+            "schedule": dict(cached.get("schedule", {})) if cached else {},
+        }
+        PollSchedule.observe(record["schedule"], feed.entries)
+        with self._lock:
+            self.misses += 1
+            self._feeds[url] = record
+        with _fetched_lock:
+            _fetched[(url, limit)] = (feed, record)
+
+        return feed
+
+    def _error(self, url: str, e: Exception) -> feedparser.FeedParserDict:
+        logger.error("Failed to fetch feed %s: %s", url, e)
+        with self._lock:
+            self.errors += 1
+        return feedparser.FeedParserDict(bozo=1, bozo_exception=e, feed=feedparser.FeedParserDict(), entries=[])
+
+    @staticmethod
+    def _serialize_entry(entry) -> dict:
+        data = {field: entry[field] for field in ENTRY_FIELDS if field in entry}
+        if entry.get("published_parsed"):
+            data["published_parsed"] = list(entry.published_parsed)
+        return data
+
+    @staticmethod
+    def _from_cache(cached: dict) -> feedparser.FeedParserDict:
+        entries = []
+        for data in cached["entries"]:
+            entry = feedparser.FeedParserDict({k: v for k, v in data.items() if k != "published_parsed"})
+            if data.get("published_parsed"):
+                entry["published_parsed"] = time.struct_time(data["published_parsed"])
+            entries.append(entry)
+
+        feed = feedparser.FeedParserDict()
+        if cached["feed"].get("title") is not None:
+            feed["title"] = cached["feed"]["title"]
+
+        return feedparser.FeedParserDict(status=304, bozo=0, feed=feed, entries=entries)
+
+    def save(self) -> None:
+        # State, not an output: fetched_at changes on every fetch, which alone is not worth a commit.
+        # It is committed along with the next output change, until then a feed is at worst polled early.
+        write_json_if_changed(
+            self.path, {"feeds": self._feeds}, output=False, ensure_ascii=False, indent=2, sort_keys=True
+        )
+
+    def summary(self) -> str:
+        total = self.hits + self.misses + self.errors
+        hit_rate = self.hits / total * 100 if total else 0.0
+        shared = f", {self.shared} shared with other jobs" if self.shared else ""
+        skipped = f", {self.skipped} not due" if self.skipped else ""
+        return (
+            f"Feed cache: {self.hits} hits, {self.misses} misses, {self.errors} errors{shared}{skipped}"
+            f" ({hit_rate:.0f}% hit rate)"
+        )
@@ -0,0 +1,57 @@
+import dataclasses
+import os
+import statistics
+import time
+
+from ops.dates import struct_time_to_timestamp
+
+HOUR = 3600
+
+# A feed is fetched at least this often, however quiet it is
+MAX_STALENESS = float(os.environ.get("FEED_MAX_STALENESS_HOURS", 72)) * HOUR
+
+
+@dataclasses.dataclass
+class PollSchedule:
+    """
+    Decides which feeds are due for fetching, from the state FeedCache keeps per feed:
+
+    - fetched_at: when the feed was last fetched (Unix timestamp)
+    - last_entry_at: publication time of its newest entry
+    - interval: estimated posting interval, median gap between its recent entries
+
+    A feed is polled every `fraction` of its posting interval; a quiet feed backs off to
+    `backoff` of the time since its last post, so a dormant one drifts to max_staleness.
+    `slack` absorbs the drift of scheduled runs (a feed due in 10 minutes is fetched now).
+    """
+
+    max_staleness: float = MAX_STALENESS
+    fraction: float = 0.5
+    backoff: float = 0.25
+    slack: float = 1 * HOUR
+
+    def poll_interval(self, state: dict, now: float) -> float:
+        if state.get("last_entry_at") is None:
+            return self.max_staleness
+        idle = max(now - state["last_entry_at"], 0)
+        interval = max(self.fraction * (state.get("interval") or 0), self.backoff * idle)
+        return min(interval, self.max_staleness)
+
+    def is_due(self, state: dict | None, now: float | None = None) -> bool:
+        if not state or state.get("fetched_at") is None:
+            return True
+        now = time.time() if now is None else now
+        return now + self.slack >= state["fetched_at"] + self.poll_interval(state, now)
+
+    @staticmethod
+    def observe(state: dict, entries, now: float | None = None) -> None:
+        """Record a fetch of the feed with these (feedparser) entries into state."""
+        published = sorted(
+            (struct_time_to_timestamp(entry["published_parsed"]) for entry in entries if entry.get("published_parsed")),
+            reverse=True,
+        )
+        state["fetched_at"] = int(time.time() if now is None else now)
+        if published:
+            state["last_entry_at"] = max(published[0], state.get("last_entry_at") or 0)
+        if len(published) >= 2:
+            state["interval"] = int(statistics.median(a - b for a, b in zip(published, published[1:])))
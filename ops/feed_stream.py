@@ -0,0 +1,165 @@
+import datetime
+import io
+import logging
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+import feedparser
+
+from ops.dates import struct_time_to_timestamp
+
+logger = logging.getLogger(__name__)
+
+_ITEM_TAGS = {"item", "entry"}
+_CHANNEL_TAGS = {"channel", "feed"}
+_DATE_TAGS = ("pubDate", "published", "date", "updated")
+
+
+class _RecordingReader(io.RawIOBase):
+    """File-like wrapper that remembers everything read, so we can fall back to feedparser."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.recorded = bytearray()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.recorded += data
+        buffer[: len(data)] = data
+        return len(data)
+
+    def read_all(self) -> bytes:
+        return bytes(self.recorded) + self.stream.read()
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_date(value: str) -> datetime.datetime | None:
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt
+
+
+def _element_text(elem: ET.Element) -> str:
+    return "".join(elem.itertext()).strip()
+
+
+def _build_entry(item: ET.Element) -> feedparser.FeedParserDict:
+    entry = feedparser.FeedParserDict()
+    children = {}
+    for child in item:
+        children.setdefault(_local_name(child.tag), child)
+
+    if "title" in children:
+        entry["title"] = _element_text(children["title"])
+
+    for child in item:
+        if _local_name(child.tag) != "link":
+            continue
+        href = child.get("href")
+        if href is None:
+            # RSS: <link>url</link>
+            entry["link"] = (child.text or "").strip()
+            break
+        if child.get("rel", "alternate") == "alternate":
+            entry["link"] = href
+            break
+
+    for tag in _DATE_TAGS:
+        if tag in children and children[tag].text:
+            entry["published"] = children[tag].text.strip()
+            published_dt = parse_date(entry["published"])
+            if published_dt:
+                # Same representation as feedparser: naive UTC struct_time
+                entry["published_parsed"] = published_dt.utctimetuple()
+            break
+
+    return entry
+
+
+def _is_older(entry, cutoff: datetime.datetime) -> bool:
+    published_parsed = entry.get("published_parsed")
+    if not published_parsed:
+        return False
+    # Compared as Unix timestamps, the way ops.entries filters: published_parsed is UTC,
+    # a naive cutoff is local time (datetime.now()), so comparing datetimes would be off
+    # by the UTC offset
+    return struct_time_to_timestamp(published_parsed) <= cutoff.timestamp()
+
+
+def iter_entries(stream, feed: feedparser.FeedParserDict):
+    """
+    Lazily yield entries of an RSS/Atom document read from stream.
+
+    The channel title is stored into feed as soon as it is seen. Raises
+    xml.etree.ElementTree.ParseError for malformed documents.
+    """
+    path = []
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        name = _local_name(elem.tag)
+        if event == "start":
+            path.append(name)
+            continue
+
+        path.pop()
+        if name in _ITEM_TAGS:
+            yield _build_entry(elem)
+            elem.clear()
+        elif name == "title" and path and path[-1] in _CHANNEL_TAGS:
+            feed["title"] = _element_text(elem)
+
+
+def parse_recent(
+    stream,
+    limit: int = 10,
+    cutoff: datetime.datetime | None = None,
+    keep_at_least: int = 3,
+    response_headers: dict | None = None,
+) -> feedparser.FeedParserDict:
+    """
+    Parse only the head of a feed, the way the scripts consume it.
+
+    Stops reading once `limit` entries newer than `cutoff` were collected, or
+    once an entry older than `cutoff` shows up after at least `keep_at_least`
+    entries (feeds are expected to be newest first). A naive `cutoff` is local time,
+    like datetime.now(). Malformed documents are
+    handed over to feedparser.parse() as a whole.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    reader = _RecordingReader(stream)
+
+    feed = feedparser.FeedParserDict()
+    entries = []
+    recent = 0
+    try:
+        for entry in iter_entries(reader, feed):
+            is_older = cutoff is not None and _is_older(entry, cutoff)
+            if is_older and len(entries) >= keep_at_least:
+                break
+            entries.append(entry)
+            if not is_older:
+                recent += 1
+                if recent >= limit and len(entries) >= keep_at_least:
+                    break
+    except ET.ParseError as e:
+        logger.debug("Streaming parse failed (%s), falling back to feedparser", e)
+        return feedparser.parse(reader.read_all(), response_headers=response_headers)
+
+    if not entries and "title" not in feed:
+        # Not something we understand (e.g. RDF without items or an HTML page)
+        return feedparser.parse(reader.read_all(), response_headers=response_headers)
+
+    return feedparser.FeedParserDict(bozo=0, feed=feed, entries=entries)
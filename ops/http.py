@@ -0,0 +1,169 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ops.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Requests per second (and burst size) allowed per domain, matched by suffix and shared by all its subdomains
+DEFAULT_HOST_RATES = {
+    "goodreads.com": (5.0, 5),
+    "gr-assets.com": (20.0, 20),
+    "substack.com": (10.0, 10),
+}
+DEFAULT_RATE = (10.0, 10)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class HttpClient:
+    """
+    Shared HTTP client for all ops scripts.
+
+    Wraps one requests.Session, so connections (and TLS sessions) to the same host
+    are pooled and kept alive between requests and threads. Every request waits for
+    a token from the per-host bucket, and connection errors or RETRY_STATUSES are
+    retried with jittered exponential backoff, honouring Retry-After.
+    """
+
+    def __init__(
+        self,
+        user_agent: str = "Mozilla/5.0",
+        timeout: float = 30,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 30,
+        pool_size: int = 32,
+        host_rates: dict[str, tuple[float, int]] | None = None,
+    ):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.host_rates = DEFAULT_HOST_RATES if host_rates is None else host_rates
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._buckets: dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        # Hosts matching a rule share the rule's bucket (every *.substack.com together),
+        # any other host gets a DEFAULT_RATE bucket of its own
+        key, (rate, capacity) = host, DEFAULT_RATE
+        for domain, domain_rate in self.host_rates.items():
+            if host == domain or host.endswith(f".{domain}"):
+                key, (rate, capacity) = domain, domain_rate
+                break
+        with self._buckets_lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            return bucket
+
+    def _backoff_seconds(self, attempt: int) -> float:
+        # "Full jitter": anywhere between 0 and the exponential backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url: str, headers: dict | None = None, timeout: float | None = None, stream: bool = False) -> requests.Response:
+        """
+        GET url. Returns the last response even if its status is an error,
+        call raise_for_status() on it when needed.
+        """
+        bucket = self._bucket(urlparse(url).hostname or "")
+        start = time.perf_counter()
+
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    get_metrics().record_request(url, None, time.perf_counter() - start, attempt + 1, None)
+                    raise
+                delay = self._backoff_seconds(attempt)
+                logger.warning("GET %s failed (%s), retrying in %.1fs", url, e, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                # Streamed bodies aren't read yet, Content-Length is the best guess
+                size = int(response.headers.get("Content-Length", 0)) if stream else len(response.content)
+                get_metrics().record_request(url, response.status_code, time.perf_counter() - start, attempt + 1, size)
+                return response
+
+            retry_after = _retry_after_seconds(response)
+            delay = min(retry_after, self.max_backoff) if retry_after is not None else self._backoff_seconds(attempt)
+            logger.warning("GET %s returned %d, retrying in %.1fs", url, response.status_code, delay)
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+_client: HttpClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Process-wide HttpClient, so every script and thread shares one connection pool."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
+
+
+def set_client(client: HttpClient) -> None:
+    """Replace the process-wide HttpClient, e.g. with an unthrottled one for the local benchmarks."""
+    global _client
+    with _client_lock:
+        _client = client
@@ -0,0 +1,148 @@
+import contextlib
+import cProfile
+import datetime
+import json
+import logging
+import pathlib
+import pstats
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from ops.output import report_changed_outputs
+
+logger = logging.getLogger(__name__)
+
+METRICS_NAME = "run_metrics.json"
+PROFILE_NAME = "run_profile.pstats"
+
+# Query parameters that must never end up in the metrics file
+_SECRET_QUERY_PARAMS = {"key"}
+
+
+def redact_url(url: str) -> str:
+    parts = urlsplit(url)
+    if not parts.query:
+        return url
+    query = [(k, "***" if k in _SECRET_QUERY_PARAMS else v) for k, v in parse_qsl(parts.query)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe="*")))
+
+
+class RunMetrics:
+    """
+    Structured telemetry of one run of a job, saved as run_metrics.json.
+
+    - phases: wall time of every `with metrics.phase(name)` block
+    - counters: `metrics.count(name)` totals (images downloaded, entries dropped, ...)
+    - items: per-feed / per-page records, `metrics.item(section, key)` returns a dict
+      the caller fills with latency, bytes, status, parse time etc.
+    - http: per-host request totals, recorded by ops.http
+
+    Thread-safe, the jobs record from their worker threads.
+    """
+
+    def __init__(self, job: str = ""):
+        self.job = job
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._start = time.perf_counter()
+        self.duration: float | None = None
+
+        self.phases: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.items: dict[str, dict[str, dict]] = {}
+        self.http: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def item(self, section: str, key: str) -> dict:
+        with self._lock:
+            return self.items.setdefault(section, {}).setdefault(redact_url(key), {})
+
+    def record_request(self, url: str, status: int | None, elapsed: float, attempts: int, size: int | None) -> None:
+        host = urlsplit(url).hostname or ""
+        with self._lock:
+            stats = self.http.setdefault(host, {"requests": 0, "retries": 0, "bytes": 0, "time": 0.0, "statuses": {}})
+            stats["requests"] += 1
+            stats["retries"] += attempts - 1
+            stats["bytes"] += size or 0
+            stats["time"] += elapsed
+            status_key = str(status) if status is not None else "error"
+            stats["statuses"][status_key] = stats["statuses"].get(status_key, 0) + 1
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job": self.job,
+                "started_at": self.started_at.isoformat(),
+                "duration": self.duration,
+                "phases": dict(self.phases),
+                "counters": dict(self.counters),
+                "http": {host: dict(stats) for host, stats in self.http.items()},
+                "items": {section: dict(items) for section, items in self.items.items()},
+            }
+
+    def save(self, path: pathlib.Path) -> None:
+        # Not an output of the job (it's uploaded as a CI artifact), so no write_if_changed()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, ensure_ascii=False, indent=2)
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.phases.items())
+        return f"Run metrics: {self.duration or 0:.1f}s total ({phases})"
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics() -> RunMetrics:
+    """Metrics of the current run. Before run_job() starts one, records go to a throwaway instance."""
+    return _metrics
+
+
+def run_job(job: str, func, output_dir: pathlib.Path, profile: bool = False, report: bool = True):
+    """
+    Run func() as `job`: collect RunMetrics, save them to output_dir/run_metrics.json
+    (also when func fails) and, with profile, dump cProfile stats to
+    output_dir/run_profile.pstats and print the hottest functions.
+
+    With report, the changed outputs are reported once func succeeds (see
+    ops.output.report_changed_outputs). ops.runner reports once for all its jobs instead.
+    """
+    global _metrics
+    _metrics = metrics = RunMetrics(job)
+    profiler = cProfile.Profile() if profile else None
+
+    try:
+        if profiler:
+            result = profiler.runcall(func)
+        else:
+            result = func()
+        if report:
+            report_changed_outputs()
+        return result
+    finally:
+        metrics.finish()
+        metrics.save(output_dir / METRICS_NAME)
+        print(metrics.summary())
+
+        if profiler:
+            profiler.dump_stats(output_dir / PROFILE_NAME)
+            stats = pstats.Stats(profiler)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(30)
+            print(f"Profile saved to {output_dir / PROFILE_NAME}, open it with `python -m pstats`")
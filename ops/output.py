@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+_changed_outputs: list[pathlib.Path] = []
+_lock = threading.Lock()
+
+
+def _file_sha256(path: pathlib.Path) -> str | None:
+    if not path.exists():
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_if_changed(path: pathlib.Path, content: str | bytes, output: bool = True) -> bool:
+    """
+    Write content to path only if it differs from what is already there.
+
+    The new content is compared by sha256 with the existing file and, when
+    different, written to a temporary file next to path and moved over it with
+    os.replace(), so readers never see a half-written file. Returns True if
+    the file was written.
+
+    output=False is for state the scripts keep between runs (caches, schedules):
+    it is written the same way but not reported by changed_outputs(), so a run
+    that only updated its state doesn't make the workflow commit.
+    """
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    if hashlib.sha256(data).hexdigest() == _file_sha256(path):
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    if output:
+        with _lock:
+            _changed_outputs.append(path)
+    logger.info("Updated %s", path)
+    return True
+
+
+def write_json_if_changed(path: pathlib.Path, data, output: bool = True, **dumps_kwargs) -> bool:
+    """json.dumps(data, **dumps_kwargs) and write_if_changed() the result."""
+    return write_if_changed(path, json.dumps(data, **dumps_kwargs), output=output)
+
+
+def changed_outputs() -> list[pathlib.Path]:
+    """Files written by write_if_changed() in this process so far."""
+    with _lock:
+        return list(_changed_outputs)
+
+
+def report_changed_outputs() -> bool:
+    """
+    Print which outputs changed and, on GitHub Actions, expose it as the `changed`
+    step output, so the commit step can be skipped when nothing changed.
+    """
+    changed = changed_outputs()
+    if changed:
+        print(f"Changed outputs ({len(changed)}):")
+        for path in changed:
+            print(f"  {path}")
+    else:
+        print("No outputs changed")
+
+    github_output = os.environ.get("GITHUB_OUTPUT")
+    if github_output:
+        with open(github_output, "a", encoding="utf-8") as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
+
+    return bool(changed)
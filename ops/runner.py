@@ -0,0 +1,124 @@
+"""
+Run several ops jobs in one process.
+
+Jobs run one after another in dependency order, so they share the warm interpreter,
+the HTTP connection pool (ops.http), feeds already fetched by another job
+(ops.feed_cache) and the changed-output tracking (ops.output), which is reported once
+at the end. Every job still writes its own run_metrics.json.
+
+Usage:
+    python -m ops.runner [JOB ...] [--all-feeds] [--profile] [--reeder-payload FILE]
+"""
+import argparse
+import dataclasses
+import importlib.util
+import logging
+import pathlib
+import sys
+from typing import Callable
+
+from ops.metrics import run_job
+from ops.output import report_changed_outputs
+
+logger = logging.getLogger(__name__)
+
+ROOT = pathlib.Path(__file__).parent.parent.resolve()
+
+
+@dataclasses.dataclass
+class Job:
+    name: str
+    # Directory of the job's script (relative to the repo root), its run_metrics.json goes there
+    directory: str
+    run: Callable[[argparse.Namespace], None]
+    # Jobs that have to finish first when they run too
+    after: tuple[str, ...] = ()
+
+
+def _load_script(name: str, path: pathlib.Path):
+    """Import a script by path: the scripts import their siblings and two of them are called run.py."""
+    if name in sys.modules:
+        return sys.modules[name]
+    if str(path.parent) not in sys.path:
+        sys.path.append(str(path.parent))
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _run_uasubstack(options: argparse.Namespace) -> None:
+    build_feed = _load_script("build_feed", ROOT / "uasubstack" / "build_feed.py")
+    build_feed.process_feeds(incremental=True, fetch_all=options.all_feeds)
+
+
+def _run_blogroll(options: argparse.Namespace) -> None:
+    _load_script("blogroll_run", ROOT / "blogroll" / "run.py").main(fetch_all=options.all_feeds)
+
+
+def _run_goodreads(options: argparse.Namespace) -> None:
+    _load_script("run_rss", ROOT / "goodreads-books" / "run_rss.py").process()
+
+
+def _run_reeder(options: argparse.Namespace) -> None:
+    if not options.reeder_payload:
+        logger.info("No --reeder-payload, nothing to do")
+        return
+    reeder_run = _load_script("reeder_run", ROOT / "reeder-starred-items" / "run.py")
+    reeder_run.save_payload(options.reeder_payload.read_text(encoding="utf-8"), merge=True)
+
+
+JOBS = [
+    Job("uasubstack", "uasubstack", _run_uasubstack),
+    # After uasubstack, so the Substack feeds both of them follow are fetched once
+    Job("blogroll", "blogroll", _run_blogroll, after=("uasubstack",)),
+    Job("goodreads", "goodreads-books", _run_goodreads),
+    Job("reeder", "reeder-starred-items", _run_reeder),
+]
+
+
+def plan(names: list[str]) -> list[Job]:
+    """Selected jobs in an order that respects `after` (otherwise in JOBS order)."""
+    selected = [job for job in JOBS if job.name in names]
+    ordered = []
+    done = set()
+    while selected:
+        ready = [job for job in selected if all(dep in done or dep not in names for dep in job.after)]
+        if not ready:
+            raise ValueError(f"Dependency cycle between {[job.name for job in selected]}")
+        for job in ready:
+            ordered.append(job)
+            done.add(job.name)
+            selected.remove(job)
+    return ordered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    job_names = [job.name for job in JOBS]
+    parser.add_argument("jobs", nargs="*", metavar="JOB", help=f"Jobs to run: {', '.join(job_names)} (default: all)")
+    parser.add_argument("--all-feeds", action="store_true", help="Fetch every feed, not only the ones that are due")
+    parser.add_argument("--profile", action="store_true", help="Profile every job with cProfile")
+    parser.add_argument("--reeder-payload", type=pathlib.Path, help="Shortcuts payload merged into the Reeder items")
+    options = parser.parse_args()
+    unknown = set(options.jobs) - set(job_names)
+    if unknown:
+        parser.error(f"unknown jobs: {', '.join(sorted(unknown))}")
+
+    failed = []
+    for job in plan(options.jobs or job_names):
+        print(f"=== {job.name} ===")
+        try:
+            run_job(job.name, lambda: job.run(options), ROOT / job.directory, profile=options.profile, report=False)
+        except Exception:
+            logger.exception("Job %s failed", job.name)
+            failed.append(job.name)
+
+    report_changed_outputs()
+    if failed:
+        sys.exit(f"Failed jobs: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import re
+import unicodedata
+
+SEARCH_INDEX_VERSION = 1
+
+# Prefixes shorter than this are not indexed (a 1-letter query would match everything),
+# tokens are indexed by prefixes up to MAX_PREFIX letters, queries are cut to it too
+MIN_PREFIX = 2
+MAX_PREFIX = 12
+
+_APOSTROPHES = str.maketrans("", "", "'’ʼ`‘")
+_FOLD = str.maketrans({"ґ": "г", "ё": "е", "ъ": "", "ß": "ss"})
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+NORMALIZATION = (
+    "casefold, drop apostrophes ('’ʼ`‘), ґ→г, ё→е, NFKD and drop combining marks "
+    "(so й→и, ї→і, é→e), split on non-word characters"
+)
+
+
+def normalize(text: str) -> str:
+    """Normalize text for search; the client must apply the same steps (see NORMALIZATION)."""
+    text = text.casefold().translate(_APOSTROPHES).translate(_FOLD)
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def tokenize(text: str | None) -> list[str]:
+    if not text:
+        return []
+    return _TOKEN_PATTERN.findall(normalize(text))
+
+
+def _field(doc, field: str) -> str | None:
+    return doc.get(field) if isinstance(doc, dict) else getattr(doc, field, None)
+
+
+def _prefixes(token: str) -> list[str]:
+    token = token[:MAX_PREFIX]
+    if len(token) < MIN_PREFIX:
+        return [token]
+    return [token[:i] for i in range(MIN_PREFIX, len(token) + 1)]
+
+
+def build_search_index(
+    docs: list,
+    prefix_fields: tuple[str, ...],
+    token_fields: tuple[str, ...] = (),
+    display_fields: tuple[str, ...] = (),
+) -> dict:
+    """
+    Build a compact inverted index over docs, for searching on the client.
+
+    docs are dicts or objects (e.g. dataclasses), a doc's id is its position in
+    docs. Words of `prefix_fields` (titles, names) are indexed by all their
+    prefixes, so the index answers search-as-you-type queries, words of
+    `token_fields` (longer text) are indexed as whole words only.
+    `display_fields` are copied into "docs", so results can be shown without
+    loading the full data file.
+
+    To answer a query the client normalizes and tokenizes it the same way, cuts
+    every word to MAX_PREFIX letters and intersects the id lists of "terms".
+    """
+    terms: dict[str, set[int]] = {}
+    for doc_id, doc in enumerate(docs):
+        for field in prefix_fields:
+            for token in tokenize(_field(doc, field)):
+                for prefix in _prefixes(token):
+                    terms.setdefault(prefix, set()).add(doc_id)
+        for field in token_fields:
+            for token in tokenize(_field(doc, field)):
+                terms.setdefault(token[:MAX_PREFIX], set()).add(doc_id)
+
+    return {
+        "version": SEARCH_INDEX_VERSION,
+        "normalization": NORMALIZATION,
+        "min_prefix": MIN_PREFIX,
+        "max_prefix": MAX_PREFIX,
+        "fields": list(display_fields),
+        "docs": [[_field(doc, field) for field in display_fields] for doc in docs],
+        "terms": {term: sorted(ids) for term, ids in sorted(terms.items())},
+    }
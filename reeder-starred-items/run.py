@@ -1,8 +1,19 @@
+import argparse
 import json
 import os
 import sys
 from pathlib import Path
-from typing import TypedDict
+from typing import Iterator, TypedDict
+
+# Make the shared `ops` package importable when running as `python run.py`
+sys.path.append(str(Path(__file__).parent.parent.resolve()))
+from ops.output import report_changed_outputs, write_json_if_changed  # noqa: E402
+
+reeder_items_json_file = Path(os.path.dirname(os.path.abspath(__file__))) / "reeder-starred-items.json"
+
+# Separators Shortcuts (or a human) may put between the concatenated JSON objects.
+# The brackets make a regular `[...]` array read item by item, so a bad item only loses itself.
+_SEPARATORS = " \t\r\n,[]"
 
 
 class ReederItem(TypedDict):
@@ -10,23 +21,93 @@ class ReederItem(TypedDict):
     url: str
 
 
+def iter_json_values(payload: str) -> Iterator:
+    """
+    Yield every JSON value of a payload made of concatenated values, e.g. `{...}\\n{...}`,
+    `{...},{...}` or a regular `[...]` array of objects (its items are yielded one by one).
+
+    strict=False lets raw newlines inside strings through, Shortcuts doesn't escape them.
+    A malformed value is skipped up to the next object (the next `{`), so one bad
+    item doesn't lose the rest of the payload.
+    """
+    decoder = json.JSONDecoder(strict=False)
+    pos = 0
+    end = len(payload)
+    while True:
+        while pos < end and payload[pos] in _SEPARATORS:
+            pos += 1
+        if pos == end:
+            return
+        try:
+            value, pos = decoder.raw_decode(payload, pos)
+        except json.JSONDecodeError as e:
+            next_pos = payload.find("{", pos + 1)
+            if next_pos == -1:
+                next_pos = end
+            print(f"Skipping invalid item at position {pos} ({e.msg}): {payload[pos:next_pos].strip()!r}")
+            pos = next_pos
+            continue
+        if isinstance(value, list):
+            yield from value
+        else:
+            yield value
+
+
 def parse_shortcuts_payload(payload: str) -> list[ReederItem]:
     # Due to stupidity of Apply Shortcuts, the payload is not a valid array JSON
     # And there is no way to fix it (convert list to array) in Shortcuts
     # It is a JSON with newlines between items
-    clean_payload = payload.strip()
-    clean_payload = clean_payload.replace("}\n{", '},{').replace('\n', '')
-    print(f"Cleaned payload: {clean_payload}")
+    items = []
+    for value in iter_json_values(payload.strip()):
+        if not isinstance(value, dict) or not value.get("url"):
+            print(f"Skipping invalid item: {value!r}")
+            continue
+        items.append(ReederItem(title=(value.get("title") or "").replace("\n", ""), url=value["url"]))
+    return items
+
+
+def load_items() -> list[ReederItem]:
+    if not reeder_items_json_file.exists():
+        return []
+    with open(reeder_items_json_file, "r", encoding="utf-8") as f:
+        return json.load(f)["items"]
+
+
+def merge_items(new_items: list[ReederItem], existing_items: list[ReederItem]) -> list[ReederItem]:
+    """New items first (newest stars on top), then the existing ones; deduplicated by URL, first one wins."""
+    merged = []
+    seen_urls = set()
+    for item in new_items + existing_items:
+        if item["url"] in seen_urls:
+            continue
+        seen_urls.add(item["url"])
+        merged.append(item)
+    return merged
+
+
+def save_payload(payload: str, merge: bool = False) -> None:
+    items = parse_shortcuts_payload(payload)
+    print(f"Received {len(items)} items")
+
+    if merge:
+        existing = load_items()
+        items = merge_items(items, existing)
+        print(f"Added {len(items) - len(existing)} new items, {len(items)} in total")
+    else:
+        items = merge_items(items, [])
 
-    posts = json.loads("[" + clean_payload.replace('\n', '') + "]")
-    return posts
+    reeder_items = {"items": items}
+    write_json_if_changed(reeder_items_json_file, reeder_items, indent=4)
 
 
 if __name__ == "__main__":
-    stdin = sys.stdin.read()
-    payload = parse_shortcuts_payload(stdin)
+    parser = argparse.ArgumentParser(description="Save Reeder starred items sent by Shortcuts (read from stdin)")
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Add the payload items to the existing file instead of replacing it, so only new stars have to be sent",
+    )
+    args = parser.parse_args()
 
-    current_file_path = os.path.dirname(os.path.abspath(__file__))
-    with open(Path(current_file_path) / "reeder-starred-items.json", "w") as f:
-        reeder_items = {"items": payload}
-        f.write(json.dumps(reeder_items, indent=4))
+    save_payload(sys.stdin.read(), merge=args.merge)
+    report_changed_outputs()
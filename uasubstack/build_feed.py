@@ -1,139 +1,229 @@
+import argparse
+import heapq
+import os
 import pathlib
-import time
-from os import listdir
-from os.path import isfile, join
-from typing import Optional
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-import feedparser
-import dataclasses
 import datetime
 import json
 
-sixty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
+# Make the shared `ops` package importable when running as `python build_feed.py`
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from ops.entries import FeedEntry, entries_from_feed, sort_key  # noqa: E402
+from ops.feed_cache import FeedCache  # noqa: E402
+from ops.feed_schedule import PollSchedule  # noqa: E402
+from ops.feed_stream import parse_date  # noqa: E402
+from ops.metrics import get_metrics, run_job  # noqa: E402
+from ops.export import export_json  # noqa: E402
+from ops.json_encoder import EnhancedJSONEncoder  # noqa: E402
+from ops.search_index import build_search_index  # noqa: E402
+from posts_archive import PostsArchive  # noqa: E402
+from registry_index import RegistryIndex  # noqa: E402
+
+# posts.json holds the posts of the last RECENT_DAYS days, older ones live in the monthly archive
+RECENT_DAYS = 30
+recent_cutoff = datetime.datetime.now() - datetime.timedelta(days=RECENT_DAYS)
+recent_cutoff_ts = int(recent_cutoff.timestamp())
 
 substacks_path = pathlib.Path(__file__).parent.resolve() / "substacks"
-aggregated_posts_path = pathlib.Path(__file__).parent.resolve() / "export" / "posts.json"
-aggregated_blogs_path = pathlib.Path(__file__).parent.resolve() / "export" / "blogs.json"
-
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            return dataclasses.asdict(o)
-        if isinstance(o, datetime.date):
-            return o.isoformat()
-        return super().default(o)
+substacks_index_path = pathlib.Path(__file__).parent.resolve() / "substacks_index.json"
+export_dir = pathlib.Path(__file__).parent.resolve() / "export"
+aggregated_posts_path = export_dir / "posts.json"
+aggregated_blogs_path = export_dir / "blogs.json"
+archive_dir = export_dir / "posts"
+feed_cache_path = pathlib.Path(__file__).parent.resolve() / "cache" / "feed_cache.json"
+
+# How many feeds are fetched at once. 1 keeps the old one-by-one behaviour.
+# Per-host politeness (rate limiting, retries) is handled by ops.http.
+FETCH_CONCURRENCY = int(os.environ.get("SUBSTACK_FETCH_CONCURRENCY", 16))
+
+FEED_REQUEST_HEADERS = {
+    "accept": "application/rss+xml",
+    "accept-language": "en-US,en;q=0.9",
+    "cache-control": "no-cache",
+    "pragma": "no-cache",
+    "priority": "u=1, i",
+    "referer": "https://substack.com/search/%D1%96?searching=all_posts",
+    "sec-ch-ua": "\"Chromium\";v=\"137\", \"Not/A)Brand\";v=\"24\"",
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": "\"macOS\"",
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "no-cors",
+    "sec-fetch-site": "cross-site",
+    "sec-fetch-storage-access": "active",
+}
 
 def build_substack_blogs():
-    feeds = []
-    for f in listdir(substacks_path):
-        if not isfile(join(substacks_path, f)):
-            continue
+    registry_index = RegistryIndex(substacks_path, substacks_index_path)
 
-        with open(join(substacks_path, f), "r") as f:
-            file_content = f.read()
-            file_json = json.loads(file_content)
-            feed_metadata = {
-                "feed_url": f"https://{file_json['subdomain']}.substack.com/feed/",
-                "logo": file_json["logo_url"],
-                "name": file_json["name"],
-                "hero_text": file_json["hero_text"],
-                "base_url": file_json["base_url"],
-            }
-            feeds.append(feed_metadata)
+    feeds = []
+    for record in registry_index.records():
+        feed_metadata = {
+            "feed_url": f"https://{record['subdomain']}.substack.com/feed/",
+            "logo": record["logo_url"],
+            "name": record["name"],
+            "hero_text": record["hero_text"],
+            "base_url": record["base_url"],
+        }
+        feeds.append(feed_metadata)
 
+    registry_index.save()
     return feeds
 
-def struct_time_to_datetime(st: time.struct_time) -> datetime.datetime:
-    """Convert a struct_time to datetime maintaining timezone information when present"""
-    tz = None
-    if hasattr(st, "tm_gmtoff") and st.tm_gmtoff is not None:
-        tz = datetime.timezone(datetime.timedelta(seconds=st.tm_gmtoff))
-    # datetime doesn't like leap seconds so just truncate to 59 seconds
-    if st.tm_sec in {60, 61}:
-        return datetime.datetime(*st[:5], 59, tzinfo=tz)
-    return datetime.datetime(*st[:6], tzinfo=tz)
-
-def should_process(entry):
-    if not hasattr(entry, "title"):
-        return False
-
-    return struct_time_to_datetime(entry.published_parsed) > sixty_days_ago
-
-@dataclasses.dataclass
-class FeedEntry():
-    channel_title: str
-    channel_url: str
-
-    title: str
-    url: str
-    published: str
-    published_parsed: time.struct_time
-
-    channel_logo: Optional[str] = None
-
-    def as_dict(self):
-        return {
-            "channel_title": self.channel_title,
-            "channel_url": self.channel_url,
-            "channel_logo": self.channel_logo,
-            "title": self.title,
-            "url": self.url,
-            "published": self.published
-        }
+def should_process(entry: FeedEntry) -> bool:
+    return entry.published_ts > recent_cutoff_ts
 
-def process_feeds():
-    blogs = build_substack_blogs()
-
-    entries: list[FeedEntry] = []
-
-    headers = {
-        "accept": "application/rss+xml",
-        "accept-language": "en-US,en;q=0.9",
-        "cache-control": "no-cache",
-        "pragma": "no-cache",
-        "priority": "u=1, i",
-        "referer": "https://substack.com/search/%D1%96?searching=all_posts",
-        "sec-ch-ua": "\"Chromium\";v=\"137\", \"Not/A)Brand\";v=\"24\"",
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": "\"macOS\"",
-        "sec-fetch-dest": "empty",
-        "sec-fetch-mode": "no-cors",
-        "sec-fetch-site": "cross-site",
-        "sec-fetch-storage-access": "active",
-    }
-
-    for i, blog in enumerate(blogs):
-        print(f"Processing feed {i}/{len(blogs)}: {blog}")
-        feed_parsed = feedparser.parse(blog["feed_url"], request_headers=headers)
-        print(f"Found {len(feed_parsed.entries)} entries")
+def fetch_feed(blog, feed_cache: FeedCache):
+    return feed_cache.parse(blog["feed_url"], request_headers=FEED_REQUEST_HEADERS, limit=10, cutoff=recent_cutoff)
 
-        feed_entries = list(filter(should_process, feed_parsed.entries))[:10]
 
-        feed_entries = [FeedEntry(
-            channel_title=feed_parsed.feed.title,
-            channel_url=blog["base_url"],
-            title=feed_entry.title,
-            url=feed_entry.link,
-            published=feed_entry.published,
-            published_parsed=feed_entry.published_parsed,
-            channel_logo=blog["logo"],
-        ) for feed_entry in feed_entries]
+def feed_to_entries(blog, feed_parsed) -> list[FeedEntry]:
+    all_entries = entries_from_feed(
+        feed_parsed,
+        channel_title=feed_parsed.feed.get("title"),
+        channel_url=blog["base_url"],
+        channel_logo=blog["logo"],
+    )
+    feed_entries = list(filter(should_process, all_entries))[:10]
+    get_metrics().item("feeds", blog["feed_url"]).update(
+        kept=len(feed_entries), dropped=len(feed_parsed.entries) - len(feed_entries)
+    )
+    return feed_entries
 
-        entries.extend(feed_entries)
 
-    # Order by date
-    entries = sorted(entries, key=lambda entry: entry.published_parsed, reverse=True)
-    print("Total entries:", len(entries))
+def load_previous_entries() -> list[FeedEntry]:
+    """Load entries of the previous posts.json export (already ordered newest first)."""
+    if not aggregated_posts_path.exists():
+        return []
 
-    with open(aggregated_posts_path, 'w', encoding='utf-8') as f:
-        books_dict = {"feed": [entry.as_dict() for entry in entries]}
-        json_str = json.dumps(books_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=None)
-        f.write(json_str)
+    with open(aggregated_posts_path, 'r', encoding='utf-8') as f:
+        previous = json.load(f)["feed"]
 
-    with open(aggregated_blogs_path, 'w', encoding='utf-8') as f:
+    entries = []
+    for item in previous:
+        published_dt = parse_date(item["published"])
+        if not published_dt:
+            continue
+        entries.append(FeedEntry(
+            channel_title=item["channel_title"],
+            channel_url=item["channel_url"],
+            title=item["title"],
+            url=item["url"],
+            published=item["published"],
+            published_ts=int(published_dt.timestamp()),
+            channel_logo=item["channel_logo"],
+        ))
+    return entries
+
+
+def merge_entries(feed_lists: list[list[FeedEntry]], previous: list[FeedEntry]) -> list[FeedEntry]:
+    """
+    Merge freshly fetched per-feed entries into the previous export.
+
+    Entries are keyed by URL: a fetched entry replaces the previous one, previous
+    entries that were not fetched this time (e.g. the feed was unreachable) are kept
+    until they fall out of the window.
+
+    This is not incremental: every run walks the whole previous export once, so it
+    costs O(previous + fresh) (posts.json is rewritten whole anyway). The previous
+    export is already newest first and is not re-sorted; only the fetched lists are,
+    as feeds don't promise an order and each holds a handful of entries.
+    """
+    fresh_lists = [sorted(feed_entries, key=sort_key, reverse=True) for feed_entries in feed_lists]
+    fresh_urls = {entry.url for feed_entries in fresh_lists for entry in feed_entries}
+    kept = [entry for entry in previous if entry.url not in fresh_urls and should_process(entry)]
+
+    merged = []
+    seen_urls = set()
+    # Every list is already ordered newest first, so a k-way merge keeps the order
+    for entry in heapq.merge(*fresh_lists, kept, key=sort_key, reverse=True):
+        if entry.url in seen_urls:
+            continue
+        seen_urls.add(entry.url)
+        merged.append(entry)
+    return merged
+
+
+def process_feeds(concurrency: int = FETCH_CONCURRENCY, incremental: bool = False, fetch_all: bool = False):
+    metrics = get_metrics()
+    with metrics.phase("registry"):
+        blogs = build_substack_blogs()
+
+    feed_lists: list[list[FeedEntry]] = []
+    # Feeds that are not due yet (see PollSchedule) are served from the cache
+    feed_cache = FeedCache(feed_cache_path, schedule=None if fetch_all else PollSchedule())
+
+    def process_blog(i, blog):
+        print(f"Processing feed {i}/{len(blogs)}: {blog}")
+        feed_parsed = fetch_feed(blog, feed_cache)
+        print(f"Found {len(feed_parsed.entries)} entries")
+        # Only the compact entries outlive this call, not the parsed feed
+        return feed_to_entries(blog, feed_parsed)
+
+    # Results are collected in registry order, so the final (stable) sort
+    # produces the same output as the sequential loop did.
+    with metrics.phase("fetch"), ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        feed_lists.extend(executor.map(process_blog, range(len(blogs)), blogs))
+
+    feed_cache.save()
+    print(feed_cache.summary())
+
+    with metrics.phase("merge"):
+        previous_entries = load_previous_entries()
+        if incremental:
+            entries = merge_entries(feed_lists, previous_entries)
+        else:
+            # Order by date
+            entries = [entry for feed_entries in feed_lists for entry in feed_entries]
+            entries.sort(key=sort_key, reverse=True)
+    print("Total entries:", len(entries))
+    metrics.count("entries", len(entries))
+
+    with metrics.phase("archive"):
+        # The previous posts.json goes in first, so posts that just left the window are
+        # archived too and fresh copies of the same URLs replace them
+        archive = PostsArchive(archive_dir)
+        archive.add([entry.as_dict() for entry in previous_entries])
+        archive.add([entry.as_dict() for entry in entries])
+        archive.save()
+
+    with metrics.phase("export"):
+        # Minified posts.json / blogs.json plus .gz / .br variants and manifest.json
+        books_dict = {"feed": [entry.as_dict() for entry in entries]}
         blogs_dict = {"feed": [blog for blog in blogs]}
-        json_str = json.dumps(blogs_dict, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=None)
-        f.write(json_str)
+        export_json(
+            export_dir,
+            {
+                aggregated_posts_path.name: books_dict,
+                aggregated_blogs_path.name: blogs_dict,
+                # Doc ids are positions in blogs.json
+                "search.json": build_search_index(
+                    blogs, prefix_fields=("name",), token_fields=("hero_text",), display_fields=("name", "base_url")
+                ),
+            },
+            cls=EnhancedJSONEncoder,
+        )
 
 if __name__ == "__main__":
-    process_feeds()
+    parser = argparse.ArgumentParser(description="Aggregate posts from the Ukrainian Substack registry")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=FETCH_CONCURRENCY,
+        help="Number of feeds fetched in parallel (1 fetches sequentially)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Merge fetched entries into the previous posts.json instead of rebuilding it",
+    )
+    parser.add_argument("--all-feeds", action="store_true", help="Fetch every feed, not only the ones that are due")
+    parser.add_argument("--profile", action="store_true", help="Profile the run with cProfile")
+    args = parser.parse_args()
+    run_job(
+        "uasubstack",
+        lambda: process_feeds(concurrency=args.concurrency, incremental=args.incremental, fetch_all=args.all_feeds),
+        pathlib.Path(__file__).parent.resolve(),
+        profile=args.profile,
+    )
@@ -0,0 +1,80 @@
+import datetime
+import hashlib
+import json
+import pathlib
+
+from ops.feed_stream import parse_date
+from ops.output import write_if_changed, write_json_if_changed
+
+INDEX_NAME = "index.json"
+
+
+def _shard_month(published_dt: datetime.datetime) -> str:
+    return published_dt.astimezone(datetime.timezone.utc).strftime("%Y-%m")
+
+
+class PostsArchive:
+    """
+    Month-sharded archive of every aggregated post: export/posts/YYYY-MM.json.
+
+    posts.json only holds the recent window, the archive keeps everything that was
+    ever in it. Posts are added by URL (a newer copy replaces the stored one) and
+    only the shards of months that received posts are loaded and rewritten, so
+    older months stay untouched and cacheable. index.json lists the shards with
+    their post counts, date ranges and a content version, for lazy loading.
+    """
+
+    def __init__(self, archive_dir: pathlib.Path):
+        self.archive_dir = archive_dir
+        self.index_path = archive_dir / INDEX_NAME
+
+        self._shards: dict[str, dict] = {}
+        if self.index_path.exists():
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._shards = {shard["month"]: shard for shard in json.load(f)["shards"]}
+
+        # month -> {url: post}, only for months touched in this run
+        self._posts: dict[str, dict[str, dict]] = {}
+
+    def _shard_path(self, month: str) -> pathlib.Path:
+        return self.archive_dir / f"{month}.json"
+
+    def _load_shard(self, month: str) -> dict[str, dict]:
+        posts = self._posts.get(month)
+        if posts is None:
+            posts = {}
+            path = self._shard_path(month)
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    posts = {post["url"]: post for post in json.load(f)["feed"]}
+            self._posts[month] = posts
+        return posts
+
+    def add(self, posts: list[dict]) -> None:
+        """Add posts (ops.entries.FeedEntry.as_dict() items), later ones win over earlier ones with the same URL."""
+        for post in posts:
+            published_dt = parse_date(post["published"])
+            if not published_dt:
+                continue
+            self._load_shard(_shard_month(published_dt))[post["url"]] = post
+
+    def save(self) -> None:
+        for month, posts in self._posts.items():
+            dated = sorted(
+                ((parse_date(post["published"]), post) for post in posts.values()),
+                key=lambda item: item[0],
+                reverse=True,
+            )
+            content = json.dumps({"feed": [post for _, post in dated]}, ensure_ascii=False, separators=(",", ":"))
+            write_if_changed(self._shard_path(month), content)
+            self._shards[month] = {
+                "month": month,
+                "path": self._shard_path(month).name,
+                "count": len(dated),
+                "first_published": dated[-1][0].isoformat(),
+                "last_published": dated[0][0].isoformat(),
+                "version": hashlib.sha256(content.encode("utf-8")).hexdigest()[:12],
+            }
+
+        shards = sorted(self._shards.values(), key=lambda shard: shard["month"], reverse=True)
+        write_json_if_changed(self.index_path, {"shards": shards}, ensure_ascii=False, indent=2)
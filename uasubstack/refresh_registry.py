@@ -0,0 +1,134 @@
+"""
+Refresh the Substack publication dumps in substacks/ from the Substack API.
+
+Every dump is checked at least once every --max-age days, oldest first (by its
+fixed day in the cycle, see due_publications()), at most --budget of them per run. Only the REGISTRY_FIELDS
+(what build_feed.py uses) that changed are written back, other fields of the dump
+are left as they are, and unchanged dumps are not rewritten.
+
+Requests go through ops.http (pooling, per-host rate limiting, retries). Point
+--url-template at a local stand-in to test, e.g. benchmarks/replay_server.py:
+    python refresh_registry.py --url-template 'http://127.0.0.1:8765/{subdomain}.substack.com/api/v1/publication'
+"""
+import argparse
+import datetime
+import json
+import logging
+import math
+import os
+import pathlib
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Make the shared `ops` package importable when running as `python refresh_registry.py`
+sys.path.append(str(pathlib.Path(__file__).parent.parent.resolve()))
+from ops.http import get_client  # noqa: E402
+from ops.output import report_changed_outputs, write_json_if_changed  # noqa: E402
+from registry_index import REGISTRY_FIELDS  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+substacks_path = pathlib.Path(__file__).parent.resolve() / "substacks"
+
+# {subdomain} and {id} are filled in from the publication dump
+PUBLICATION_URL_TEMPLATE = os.environ.get(
+    "SUBSTACK_PUBLICATION_URL", "https://{subdomain}.substack.com/api/v1/publication"
+)
+MAX_AGE_DAYS = int(os.environ.get("SUBSTACK_REFRESH_MAX_AGE_DAYS", 30))
+BUDGET = int(os.environ.get("SUBSTACK_REFRESH_BUDGET", 100))
+CONCURRENCY = int(os.environ.get("SUBSTACK_REFRESH_CONCURRENCY", 8))
+
+
+def due_publications(max_age_days: int, budget: int, today: datetime.date) -> list[str]:
+    """
+    Names of the dumps to refresh today, oldest first, at most budget of them.
+
+    Nothing is stored between runs. The dumps are spread evenly (in crc32 order of
+    their names) over the days of a cycle of max_age_days, and a dump counts as
+    checked on its day of the cycle. Its age is the number of days since then, so
+    filling the budget from the oldest checks every dump on the last few days
+    before its next turn: the budget decides how many missed runs are caught up.
+    When the budget can't cover max_age_days the cycle is stretched to fit.
+    """
+    names = sorted(
+        (path.stem for path in substacks_path.glob("*.json")), key=lambda name: (zlib.crc32(name.encode("utf-8")), name)
+    )
+    if not names or budget <= 0:
+        return []
+
+    cycle = max(max_age_days, math.ceil(len(names) / budget), 1)
+    if cycle > max_age_days:
+        logger.warning(
+            "%d publications don't fit a budget of %d per day, checking each every %d days", len(names), budget, cycle
+        )
+    per_day = math.ceil(len(names) / cycle)
+
+    def age(rank: int) -> int:
+        return (today.toordinal() - rank // per_day) % cycle
+
+    ranks = sorted(range(len(names)), key=lambda rank: (-age(rank), rank))
+    return [names[rank] for rank in ranks[:budget]]
+
+
+def refresh_publication(name: str, url_template: str) -> bool:
+    """Fetch the publication and rewrite its dump when a relevant field changed. Returns whether it did."""
+    path = substacks_path / f"{name}.json"
+    with open(path, "r", encoding="utf-8") as f:
+        publication = json.load(f)
+
+    url = url_template.format(subdomain=publication["subdomain"], id=publication["id"])
+    response = get_client().get(url, headers={"accept": "application/json"})
+    response.raise_for_status()
+    fetched = response.json()
+    if not isinstance(fetched, dict) or fetched.get("id") != publication["id"]:
+        raise ValueError(f"{url} returned another publication")
+
+    # The API may leave out some of the fields the dumps have (e.g. base_url), those are kept
+    changed = {field for field in REGISTRY_FIELDS if field in fetched and fetched[field] != publication.get(field)}
+    if not changed:
+        return False
+
+    logger.info("%s: %s changed", name, ", ".join(sorted(changed)))
+    publication.update({field: fetched[field] for field in changed})
+    write_json_if_changed(path, publication, ensure_ascii=False, indent=4)
+    return True
+
+
+def refresh(
+    url_template: str = PUBLICATION_URL_TEMPLATE,
+    max_age_days: int = MAX_AGE_DAYS,
+    budget: int = BUDGET,
+    concurrency: int = CONCURRENCY,
+) -> None:
+    names = due_publications(max_age_days, budget, datetime.date.today())
+    print(f"Refreshing {len(names)} publications")
+
+    def check(name: str) -> str:
+        try:
+            updated = refresh_publication(name, url_template)
+        except Exception as e:
+            logger.error("Failed to refresh %s: %s", name, e)
+            return "failed"
+        return "updated" if updated else "unchanged"
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        results = list(executor.map(check, names))
+
+    print(
+        f"Registry refresh: {results.count('updated')} updated, {results.count('unchanged')} unchanged, "
+        f"{results.count('failed')} failed"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url-template", default=PUBLICATION_URL_TEMPLATE, help="Publication API URL, {subdomain} and {id} are filled in")
+    parser.add_argument("--max-age", type=int, default=MAX_AGE_DAYS, help="Check every dump at least once per this many days")
+    parser.add_argument("--budget", type=int, default=BUDGET, help="Refresh at most this many dumps per run")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Number of publications fetched in parallel")
+    args = parser.parse_args()
+
+    refresh(url_template=args.url_template, max_age_days=args.max_age, budget=args.budget, concurrency=args.concurrency)
+    report_changed_outputs()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import pathlib
+from os import listdir
+from os.path import isfile, join
+
+from ops.output import write_json_if_changed
+
+# Keys of the Substack publication dump that build_feed.py actually uses
+REGISTRY_FIELDS = ("subdomain", "logo_url", "name", "hero_text", "base_url")
+
+_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+
+
+def extract_fields(path: pathlib.Path | str, fields=REGISTRY_FIELDS) -> dict:
+    """
+    Extract top-level fields from a JSON object file without loading the whole document.
+
+    The file is read in chunks and walked key by key. Values of unwanted keys are
+    decoded and dropped straight away, and reading stops as soon as every requested
+    field has been found. Missing fields are returned as None.
+    """
+    decoder = json.JSONDecoder()
+    wanted = set(fields)
+    found = {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            # Drop what was already consumed and read the next chunk
+            chunk = f.read(_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def skip_whitespace() -> bool:
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return True
+                if eof:
+                    return False
+                fill()
+
+        def decode_next():
+            nonlocal pos
+            while skip_whitespace():
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A value touching the end of the buffer may be truncated (e.g. a number)
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+            raise ValueError(f"Unexpected end of file in {path}")
+
+        def expect(chars: str) -> str:
+            nonlocal pos
+            if not skip_whitespace():
+                raise ValueError(f"Unexpected end of file in {path}")
+            char = buffer[pos]
+            if char not in chars:
+                raise ValueError(f"Expected one of {chars!r} in {path}, got {char!r}")
+            pos += 1
+            return char
+
+        expect("{")
+        while wanted - found.keys():
+            key = decode_next()
+            expect(":")
+            value = decode_next()
+            if key in wanted:
+                found[key] = value
+            if expect(",}") == "}":
+                break
+
+    return {field: found.get(field) for field in fields}
+
+
+def _file_sha256(path: pathlib.Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RegistryIndex:
+    """
+    Compact index of the Substack registry, kept next to the full publication dumps.
+
+    Every entry holds only REGISTRY_FIELDS plus the sha256 of the source file. Each
+    run hashes the dumps (a plain read, much cheaper than parsing them) and only
+    re-extracts the ones whose content changed. Content hashes survive a checkout,
+    unlike mtimes, so the index is reused on CI as well and holds nothing machine-specific.
+    """
+
+    def __init__(self, substacks_path: pathlib.Path, index_path: pathlib.Path):
+        self.substacks_path = substacks_path
+        self.index_path = index_path
+        self.changed = False
+
+        self._files: dict[str, dict] = {}
+        if index_path.exists():
+            with open(index_path, "r", encoding="utf-8") as f:
+                self._files = json.load(f).get("files", {})
+
+    def records(self) -> list[dict]:
+        """Return the registry fields of every publication, in directory listing order."""
+        records = []
+        seen = set()
+
+        for name in listdir(self.substacks_path):
+            path = self.substacks_path / name
+            if not isfile(join(self.substacks_path, name)):
+                continue
+            seen.add(name)
+            records.append(self._record(name, path))
+
+        for name in set(self._files) - seen:
+            del self._files[name]
+            self.changed = True
+
+        return records
+
+    def _record(self, name: str, path: pathlib.Path) -> dict:
+        entry = self._files.get(name)
+        sha256 = _file_sha256(path)
+        if not entry or entry["sha256"] != sha256:
+            entry = {"sha256": sha256, "fields": extract_fields(path)}
+            self._files[name] = entry
+            self.changed = True
+        return entry["fields"]
+
+    def save(self) -> None:
+        if not self.changed:
+            return
+        write_json_if_changed(self.index_path, {"files": self._files}, ensure_ascii=False, indent=2, sort_keys=True)
+        self.changed = False